@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules imported by the worker processes of sweeps and partitioned runs, or
+# by scripts reading from the cache
+MODULES = (
+    'executor.simple_executor',
+    'executor.sweep',
+    'executor.partitioned',
+    'data_source.polygon',
+)
+# Dependencies that should only be loaded when used
+HEAVY_MODULES = ('pandas', 'matplotlib', 'pytz', 'requests')
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module, repeat=5, statement='pass'):
+    # Imports module in a fresh interpreter with -X importtime and runs
+    # statement, e.g. a read from the cache. Returns the best cumulative
+    # import time in seconds and the heavy modules loaded.
+    code = 'import sys, json, {module}\n{statement}\nprint(json.dumps([name for name in {heavy} if name in sys.modules]))'.format(
+        module=module,
+        statement=statement,
+        heavy=HEAVY_MODULES,
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_PATH, os.environ.get('PYTHONPATH')])))
+    seconds = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env, check=True)
+        # import time: self [us] | cumulative | imported package
+        for line in process.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                seconds.append(int(fields[1]) / 1e6)
+        loaded = json.loads(process.stdout.splitlines()[-1])
+    return min(seconds), loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import time of the modules spawned workers load')
+    parser.add_argument('--modules', default=','.join(MODULES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results to a JSON file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules.split(','):
+        seconds, loaded = measure_import(module, args.repeat)
+        print('{}: {:.1f}ms, heavy modules loaded: {}'.format(module, seconds * 1000, ', '.join(loaded) or 'none'))
+        results.append({'module': module, 'seconds': seconds, 'heavy_modules': loaded})
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
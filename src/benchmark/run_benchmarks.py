@@ -0,0 +1,206 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas
+from pytz import utc
+from benchmark.synthetic import generate_market_data
+from executor.order_book import OrderBook
+from executor.simple_executor import SimpleExecutor
+from util.bar_store import BarStore
+from util.dataframe_util import get_values_at_timestamp
+
+# Bars per horizon, a year of days or a day of minutes
+HORIZON_BARS = {'day': 252, 'minute': 390}
+SYMBOLS = (10, 100, 1000, 10000)
+
+
+def _utc(timestamp_ms):
+    return datetime.fromtimestamp(timestamp_ms / 1000, utc)
+
+
+def _limit_orders(executor, bar_store):
+    # One open order per symbol that never fills, so that every bar checks
+    # all of them
+    time = _utc(bar_store.timestamps[0])
+    for symbol in bar_store.symbols:
+        executor.request_new_order(time, symbol, 1, 'buy', 'limit', 'gtc', 0.0, None, False, symbol)
+
+
+def bench_execute_strategy(data, bar_store):
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        symbol = bar_store.symbols[len(historical_data) % len(bar_store.symbols)]
+        if not np.isnan(current_data[symbol]):
+            request_new_order(symbol, 1, 'buy', 'market', 'day', None, None, False, symbol)
+
+    def run():
+        executor = SimpleExecutor()
+        executor.set_cash(1e12)
+        executor.execute_strategy(strategy, data, _utc(bar_store.timestamps[0]), _utc(bar_store.timestamps[-1]))
+    return run
+
+
+def bench_get_values_at_timestamp(data, bar_store):
+    def run():
+        for timestamp_ms in data.index:
+            get_values_at_timestamp(data, timestamp_ms)
+    return run
+
+
+def bench_filter_data(data, bar_store):
+    executor = SimpleExecutor()
+    start = _utc(bar_store.timestamps[0])
+
+    def run():
+        for timestamp_ms in bar_store.timestamps:
+            executor.filter_data(data, start, _utc(timestamp_ms), False)
+    return run
+
+
+def bench_check_orders_execution(data, bar_store):
+    executor = SimpleExecutor()
+    _limit_orders(executor, bar_store)
+
+    def run():
+        for index in range(len(bar_store)):
+            executor.check_orders_execution(_utc(bar_store.timestamps[index]), bar_store.row_at(index))
+    return run
+
+
+def bench_match_open_orders(data, bar_store):
+    executor = SimpleExecutor()
+    _limit_orders(executor, bar_store)
+
+    def run():
+        executor.order_book = OrderBook(bar_store.symbol_index)
+        for order in executor.state['orders']:
+            executor.order_book.add(order)
+        for index in range(len(bar_store)):
+            executor.match_open_orders(_utc(bar_store.timestamps[index]), bar_store.row_at(index))
+    return run
+
+
+def bench_portfolio_value(data, bar_store):
+    executor = SimpleExecutor()
+    for symbol in bar_store.symbols:
+        executor.update_position(symbol, 1)
+
+    def run():
+        for index in range(len(bar_store)):
+            executor.portfolio_value(bar_store.row_at(index))
+    return run
+
+
+BENCHMARKS = {
+    'execute_strategy': bench_execute_strategy,
+    'get_values_at_timestamp': bench_get_values_at_timestamp,
+    'filter_data': bench_filter_data,
+    'check_orders_execution': bench_check_orders_execution,
+    'match_open_orders': bench_match_open_orders,
+    'portfolio_value': bench_portfolio_value,
+}
+
+
+def measure(run, repeat, memory):
+    # Best wall time of repeat runs, peak traced memory of a separate run so
+    # that tracing doesn't slow down the timed ones
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return min(seconds), peak_memory
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(benchmarks, symbols, horizons, repeat=3, memory=True):
+    results = []
+    for horizon in horizons:
+        for symbol_count in symbols:
+            data = generate_market_data(symbol_count, HORIZON_BARS[horizon], horizon)
+            bar_store = BarStore.from_dataframe(data)
+            for name in benchmarks:
+                run = BENCHMARKS[name](data, bar_store)
+                seconds, peak_memory = measure(run, repeat, memory)
+                result = {
+                    'benchmark': name,
+                    'horizon': horizon,
+                    'symbols': symbol_count,
+                    'bars': len(bar_store),
+                    'seconds': seconds,
+                    'bar_symbols_per_second': len(bar_store) * symbol_count / seconds,
+                    'peak_memory_bytes': peak_memory,
+                }
+                print('{benchmark} {horizon} {symbols} symbols: {seconds:.4f}s, {bar_symbols_per_second:.0f} bars x symbols/s'.format(**result))
+                results.append(result)
+    return results
+
+
+def compare(baseline_path, results_path):
+    # Throughput ratio of every benchmark present in both result files
+    with open(baseline_path) as f:
+        baseline = {(r['benchmark'], r['horizon'], r['symbols']): r for r in json.load(f)['results']}
+    with open(results_path) as f:
+        results = json.load(f)['results']
+    for result in results:
+        key = (result['benchmark'], result['horizon'], result['symbols'])
+        if key in baseline:
+            ratio = result['bar_symbols_per_second'] / baseline[key]['bar_symbols_per_second']
+            print('{} {} {} symbols: {:.2f}x'.format(*key, ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtesting benchmarks on synthetic market data')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--symbols', default=','.join(str(count) for count in SYMBOLS))
+    parser.add_argument('--horizons', default=','.join(HORIZON_BARS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory measurement')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare the output with a previous results file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.benchmarks.split(','),
+        [int(count) for count in args.symbols.split(',')],
+        args.horizons.split(','),
+        repeat=args.repeat,
+        memory=not args.no_memory,
+    )
+    with open(args.output, 'w') as f:
+        json.dump({
+            'metadata': {
+                'commit': get_commit(),
+                'created_at': datetime.now(utc).isoformat(),
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'pandas': pandas.__version__,
+                'machine': platform.machine(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print('Results written to {}'.format(args.output))
+
+    if args.compare:
+        compare(args.compare, args.output)
+
+
+if __name__ == '__main__':
+    main()
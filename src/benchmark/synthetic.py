@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import numpy as np
+from pytz import utc
+from pandas import DataFrame, Index, MultiIndex
+
+DAY_MS = 24 * 60 * 60 * 1000
+MINUTE_MS = 60 * 1000
+# Regular session, 9:30 to 16:00 US/Eastern in UTC ignoring daylight saving
+SESSION_START_MS = (14 * 60 + 30) * MINUTE_MS
+SESSION_MINUTES = 390
+
+
+def get_timestamps(interval, bars, start=datetime(2019, 1, 1, tzinfo=utc)):
+    # Weekdays only, one bar per day or one per minute of the session
+    assert interval in ('day', 'minute'), 'Interval not supported {}'.format(interval)
+    timestamps = []
+    day = start
+    while len(timestamps) < bars:
+        if day.weekday() < 5:
+            day_ms = int(day.timestamp() * 1000)
+            if interval == 'day':
+                timestamps.append(day_ms)
+            else:
+                session_start_ms = day_ms + SESSION_START_MS
+                timestamps.extend(session_start_ms + minute * MINUTE_MS for minute in range(SESSION_MINUTES))
+        day += timedelta(days=1)
+    return np.array(timestamps[:bars], dtype=np.int64)
+
+
+def generate_market_data(symbols, bars, interval='day', missing=0.1, seed=0):
+    # Random walk o/h/l/c bars in the layout returned by
+    # get_stocks_aggregate_data, one row per timestamp and a (field, symbol)
+    # column multi index. A fraction missing of the bars is NaN, like
+    # illiquid tickers that didn't trade.
+    rng = np.random.default_rng(seed)
+    volatility = 0.02 if interval == 'day' else 0.001
+    shape = (bars, symbols)
+    start_price = rng.uniform(5, 500, symbols)
+    c = start_price * np.exp(np.cumsum(rng.normal(0, volatility, shape), axis=0))
+    o = np.vstack([start_price, c[:-1]]) * np.exp(rng.normal(0, volatility / 4, shape))
+    h = np.maximum(o, c) * (1 + np.abs(rng.normal(0, volatility / 2, shape)))
+    l = np.minimum(o, c) * (1 - np.abs(rng.normal(0, volatility / 2, shape)))
+    missing_bars = rng.random(shape) < missing
+    fields = {'o': o, 'c': c, 'h': h, 'l': l}
+    for values in fields.values():
+        values[missing_bars] = np.nan
+
+    names = ['SYM{:05d}'.format(index) for index in range(symbols)]
+    columns = MultiIndex.from_product([list(fields), names], names=[None, 'symbol'])
+    return DataFrame(
+        np.hstack(list(fields.values())),
+        index=Index(get_timestamps(interval, bars), name='t'),
+        columns=columns,
+    )
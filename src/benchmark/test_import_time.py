@@ -0,0 +1,8 @@
+from benchmark.import_time import MODULES, measure_import
+
+
+def test_imports_are_light():
+    for module in MODULES:
+        seconds, loaded = measure_import(module, repeat=1)
+        assert seconds > 0
+        assert loaded == []
@@ -0,0 +1,21 @@
+import numpy as np
+from benchmark.synthetic import generate_market_data
+from benchmark.run_benchmarks import BENCHMARKS, run_benchmarks
+from util.bar_store import BarStore
+
+
+def test_generate_market_data():
+    data = generate_market_data(20, 50, 'minute', missing=0.2)
+    bar_store = BarStore.from_dataframe(data)
+    assert bar_store.c.shape == (50, 20)
+    assert (np.diff(bar_store.timestamps) > 0).all()
+    traded = ~np.isnan(bar_store.c)
+    assert 0.1 < 1 - traded.mean() < 0.3
+    assert (bar_store.h[traded] >= np.maximum(bar_store.o, bar_store.c)[traded]).all()
+    assert (bar_store.l[traded] <= np.minimum(bar_store.o, bar_store.c)[traded]).all()
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(list(BENCHMARKS), [5], ['day'], repeat=1, memory=False)
+    assert [result['benchmark'] for result in results] == list(BENCHMARKS)
+    assert all(result['bar_symbols_per_second'] > 0 for result in results)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+# Responses worth retrying: rate limited or server side errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    # Allows rate requests per second on average with bursts up to capacity,
+    # shared by all the threads using the same client
+    def __init__(self, rate, capacity=None):
+        assert rate > 0, 'rate should be positive {}'.format(rate)
+        assert capacity is None or capacity >= 1, 'capacity should be at least 1 {}'.format(capacity)
+        self.rate = rate
+        # A request needs a whole token, rates under one request per second
+        # still allow one
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    # One pooled session reused by every request, keeping up to
+    # max_connections connections alive for concurrent fetches
+    def __init__(self, max_connections=10, rate_limit=None, burst=None, retries=5, backoff=0.5):
+        # requests is only imported once a client is needed, reading from the
+        # cache never loads it
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit is not None else None
+        self.retries = retries
+        self.backoff = backoff
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** attempt
+
+    def get_json(self, url):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            response = self.session.get(url)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response.json()
+            if attempt >= self.retries:
+                response.raise_for_status()
+            print('Retry {} after status {}'.format(url.split('?')[0], response.status_code))
+            time.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+
+class LazyHttpClient:
+    # Creates its HttpClient on the first request, reading from the cache
+    # never imports requests
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.client = None
+        self.lock = threading.Lock()
+
+    def get_json(self, url):
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = HttpClient(**self.kwargs)
+        return self.client.get_json(url)
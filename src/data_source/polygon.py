@@ -1,11 +1,30 @@
-import requests
-from datetime import datetime
-from pandas import DataFrame, HDFStore, concat, pivot
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+import numpy as np
 from util.cache_util import get_cached_dataframe, get_cached_dict
+from util.bar_cache import bars_from_columns, concat_bars, empty_bars, get_cached_bar_range, parse_bar_records, unique_bars
+from util.bar_store import FIELDS, BarStore, BarStoreBuilder
+from util.resample import get_rollup, resample_bars
 from urllib.parse import urlencode
+from data_source.http_client import LazyHttpClient
 
 MAX_PAGES = 1000
 BASE_API_URL = 'https://api.polygon.io'
+# Length of the bars of every interval
+INTERVAL_MS = {'day': 24 * 60 * 60 * 1000, 'minute': 60 * 1000}
+
+_http_client = None
+
+def get_http_client():
+    # Shared pooled client used when none is passed explicitly, created on
+    # the first download
+    global _http_client
+    if _http_client is None:
+        _http_client = LazyHttpClient()
+    return _http_client
 
 def _format_datetime(dt):
     timestamp_ms = int(dt.timestamp() * 1000)
@@ -18,56 +37,80 @@ def _format_datetime_log(dt, interval):
         return dt.strftime('%Y-%m-%dT%H:%M:%S')
     raise Exception('Interval not supported {}'.format(interval))
 
-def get_aggregate_symbol(symbol, interval, start, end, api_key):
-    assert interval in {'day', 'minute'}
-    assert isinstance(start, datetime)
-    assert isinstance(end, datetime)
-    assert start.tzinfo is not None, 'The start date should be timezone aware'
-    assert end.tzinfo is not None, 'The end date should be timezone aware'
-
-    results = []
-    time_intervals = set()
+def _download_aggregate_symbol(symbol, interval, start, end, api_key, client):
+    # Every page is parsed into typed columns, pages are deduplicated and
+    # sorted by t at the end
+    pages = []
+    timestamps = np.empty(0, dtype=np.int64)
     finished = False
     page = 0
     while (not finished):
-        def get_page():
-            print('Fetch {} from {} to {}'.format(symbol, _format_datetime_log(start, interval), _format_datetime_log(end, interval)))
-            if page > MAX_PAGES:
-                raise Exception('Too many pages downloaded: {}'.format('page'))
-            response = requests.get('{api}/v2/aggs/ticker/{symbol}/range/1/{interval}/{start}/{end}?apiKey={api_key}'.format(**{
-                'api': BASE_API_URL,
-                'symbol': symbol,
-                'interval': interval,
-                'start': _format_datetime(start),
-                'end': _format_datetime(end),
-                'api_key': api_key
-            }))
-            return response.json()
-        reponse_dict = get_cached_dict('get_aggregate_symbol', '{}_{}_{}_{}_{}'.format(symbol, interval, _format_datetime(start), _format_datetime(end), page), get_page)
-        finished = True
+        print('Fetch {} from {} to {}'.format(symbol, _format_datetime_log(start, interval), _format_datetime_log(end, interval)))
+        if page > MAX_PAGES:
+            raise Exception('Too many pages downloaded: {}'.format('page'))
+        reponse_dict = client.get_json('{api}/v2/aggs/ticker/{symbol}/range/1/{interval}/{start}/{end}?apiKey={api_key}'.format(**{
+            'api': BASE_API_URL,
+            'symbol': symbol,
+            'interval': interval,
+            'start': _format_datetime(start),
+            'end': _format_datetime(end),
+            'api_key': api_key
+        }))
         if reponse_dict['results'] is None:
             break
-        for result in reponse_dict['results']:
-            timestamp = result['t']
-            # Deduplicate results
-            if timestamp not in time_intervals:
-                finished = False
-                time_intervals.add(timestamp)
-                results.append({
-                    't': int(result['t']),
-                    'o': float(result['o']),
-                    'c': float(result['c']),
-                    'h': float(result['h']),
-                    'l': float(result['l']),
-                })
+        columns = parse_bar_records(reponse_dict['results'])
+        # Finished once a page brings no new timestamp
+        finished = np.isin(columns['t'], timestamps).all()
+        if not finished:
+            pages.append(columns)
+            timestamps = np.union1d(timestamps, columns['t'])
         if len(reponse_dict['results']) > 0:
             end = datetime.fromtimestamp(reponse_dict['results'][0]['t'] / 1000.0)
         page += 1
-    df = DataFrame(results)
+    if len(pages) == 0:
+        return empty_bars()
+    return bars_from_columns(unique_bars(concat_bars(pages)))
+
+def get_aggregate_symbol(symbol, interval, start, end, api_key, client=None):
+    assert interval in {'day', 'minute'}
+    assert isinstance(start, datetime)
+    assert isinstance(end, datetime)
+    assert start.tzinfo is not None, 'The start date should be timezone aware'
+    assert end.tzinfo is not None, 'The end date should be timezone aware'
+
+    client = client or get_http_client()
+
+    def download(range_start, range_end):
+        return _download_aggregate_symbol(
+            symbol,
+            interval,
+            datetime.fromtimestamp(range_start / 1000.0, timezone.utc),
+            datetime.fromtimestamp(range_end / 1000.0, timezone.utc),
+            api_key,
+            client
+        )
+
+    # One columnar entry per symbol and interval holding all the ranges
+    # downloaded so far, only the missing parts of the range are fetched.
+    # Bars that may not be complete yet are downloaded again next time.
+    df = get_cached_bar_range(
+        'get_aggregate_symbol_range',
+        '{}_{}'.format(symbol, interval),
+        _format_datetime(start),
+        _format_datetime(end),
+        download,
+        complete_until=int(time.time() * 1000) - INTERVAL_MS[interval]
+    )
     df['symbol'] = symbol
     return df
 
-def get_tickers(type, market, api_key):
+def get_aggregate_symbol_rollup(symbol, timeframe, start, end, api_key, client=None, offset_ms=0):
+    # Bars of a coarser timeframe rolled up from the cached minute bars, so
+    # one minute download serves every timeframe
+    return resample_bars(get_aggregate_symbol(symbol, 'minute', start, end, api_key, client=client), timeframe, offset_ms)
+
+def get_tickers(type, market, api_key, client=None):
+    client = client or get_http_client()
     tickers = set()
     page = 1
     print('Get tickers')
@@ -80,11 +123,10 @@ def get_tickers(type, market, api_key):
                 'sort': 'ticker',
                 'apiKey': api_key,
             }.items() if value is not None})
-            response = requests.get('{api}/v2/reference/tickers?{qs}'.format(**{
+            tickers_dict = client.get_json('{api}/v2/reference/tickers?{qs}'.format(**{
                 'api': BASE_API_URL,
                 'qs': qs
             }))
-            tickers_dict = response.json()
             assert tickers_dict['status'] == 'OK', 'Status is {}'.format(status)
             assert tickers_dict['page'] == page
             assert len(tickers_dict['tickers']) > 0
@@ -100,30 +142,101 @@ def get_tickers(type, market, api_key):
     print('Total number of tickers: {num_tickers}'.format(num_tickers=len(tickers)))
     return tickers
 
-def get_stocks_aggregate_data(type, market, interval, start, end, api_key):
+def get_stocks_aggregate_data(type, market, interval, start, end, api_key, max_workers=1, rate_limit=None, client=None, on_symbol=None):
+    # max_workers symbols are downloaded concurrently through one pooled
+    # session, rate_limit caps the requests per second across all of them.
+    # on_symbol(builder) is called after every symbol is added, a partial
+    # store can be taken with builder.snapshot() while the download goes on.
     assert interval in {'day', 'minute'}
     assert isinstance(start, datetime)
     assert isinstance(end, datetime)
     assert start.tzinfo is not None, 'The start date should be timezone aware'
     assert end.tzinfo is not None, 'The end date should be timezone aware'
 
-    symbols = get_tickers(type, market, api_key)
-    dfs = []
-    for index, symbol in enumerate(symbols):
-        print('Get aggreagate data for symbol {} ({}/{})'.format(symbol, index + 1, len(symbols)))
-        dfs.append(get_aggregate_symbol(symbol, interval, start, end, api_key))
-    data_concat = concat(dfs, sort=False)
-    # Creates one row per timestamp
-    data_pivoted = pivot(data_concat, index='t', columns='symbol')
-    return data_pivoted
-
-def get_ticker_type(api_key):
+    client = client or LazyHttpClient(max_connections=max_workers, rate_limit=rate_limit)
+
+    def get_data_pivoted():
+        symbols = get_tickers(type, market, api_key, client=client)
+        # Every symbol is written into the (timestamp x symbol) arrays as soon
+        # as it is downloaded and then released
+        builder = BarStoreBuilder(symbols)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(get_aggregate_symbol, symbol, interval, start, end, api_key, client=client): symbol
+                for symbol in symbols
+            }
+            for index, future in enumerate(as_completed(futures)):
+                symbol = futures.pop(future)
+                print('Get aggreagate data for symbol {} ({}/{})'.format(symbol, index + 1, len(symbols)))
+                builder.add(symbol, future.result())
+                if on_symbol is not None:
+                    on_symbol(builder)
+        # Creates one row per timestamp
+        return builder.build().to_frame()
+
+    # The pivoted frame is computed once and then reloaded from a single file
+    return get_cached_dataframe(
+        'get_stocks_aggregate_data',
+        '{}_{}_{}_{}_{}'.format(type, market, interval, _format_datetime(start), _format_datetime(end)),
+        get_data_pivoted
+    )
+
+def get_stocks_aggregate_memmap(path, type, market, interval, start, end, api_key, max_workers=1, rate_limit=None, client=None, dtype=np.float64):
+    # Same data as get_stocks_aggregate_data, written once to memory mapped
+    # o/h/l/c files in path and opened read only. The full pivoted frame is
+    # never held in memory: a first pass collects the timestamps, a second
+    # one writes every symbol's column from the bar cache. The index of the
+    # symbols active at every timestamp is saved with it, and dtype=np.float32
+    # halves the size of the store. Backtests can pass
+    # path straight to SimpleExecutor.execute_strategy and concurrent
+    # processes share the same page cache.
+    if os.path.exists(path):
+        return BarStore.load(path)
+
+    client = client or LazyHttpClient(max_connections=max_workers, rate_limit=rate_limit)
+    symbols = sorted(get_tickers(type, market, api_key, client=client))
+
+    def get_symbol(symbol):
+        return get_aggregate_symbol(symbol, interval, start, end, api_key, client=client)
+
+    timestamps = np.empty(0, dtype=np.int64)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for index, df in enumerate(pool.map(get_symbol, symbols)):
+            print('Get aggreagate data for symbol {} ({}/{})'.format(symbols[index], index + 1, len(symbols)))
+            timestamps = np.union1d(timestamps, df['t'].to_numpy(dtype=np.int64))
+
+    # Written to a temporary directory and moved in place once complete
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    bar_store = BarStore.create(temp_path, timestamps, symbols, dtype)
+    for column, symbol in enumerate(symbols):
+        df = get_symbol(symbol)
+        rows = np.searchsorted(timestamps, df['t'].to_numpy(dtype=np.int64))
+        for field in FIELDS:
+            bar_store.field(field)[rows, column] = df[field].to_numpy()
+    bar_store.flush()
+    bar_store.index_active().save_active_index(temp_path)
+    del bar_store
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        # Built by another process in the meantime
+        shutil.rmtree(temp_path)
+    return BarStore.load(path)
+
+def get_stocks_aggregate_rollup(path, timeframe, type, market, start, end, api_key, max_workers=1, rate_limit=None, client=None, offset_ms=0, dtype=np.float64):
+    # Rollup of the minute bars memory mapped in path, computed once and
+    # cached inside path
+    get_stocks_aggregate_memmap(path, type, market, 'minute', start, end, api_key, max_workers=max_workers, rate_limit=rate_limit, client=client, dtype=dtype)
+    return get_rollup(path, timeframe, offset_ms)
+
+def get_ticker_type(api_key, client=None):
+    client = client or get_http_client()
     print('Get ticker types')
-    response = requests.get('{api}/v2/reference/types?apiKey={api_key}'.format(**{
+    tickers_dict = client.get_json('{api}/v2/reference/types?apiKey={api_key}'.format(**{
         'api': BASE_API_URL,
         'api_key': api_key
     }))
-    tickers_dict = response.json()
     assert tickers_dict['status'] == 'OK'
     return tickers_dict['results']
 
@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pytest
+from pytz import utc
+import util.cache_util
+import data_source.polygon
+from benchmark.import_time import measure_import
+from data_source.http_client import HttpClient, TokenBucket
+from data_source.polygon import get_aggregate_symbol, get_stocks_aggregate_data, get_stocks_aggregate_memmap
+from util.bar_store import BarStore
+
+SYMBOLS = ['SYMBOL1', 'SYMBOL2', 'SYMBOL3']
+TIMESTAMPS = [1546300800000, 1546387200000, 1546473600000]
+
+
+class StubPolygonHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        server = self.server
+        with server.lock:
+            server.requests.append(path)
+            # Every aggregate path is rate limited the first time it is requested
+            rate_limited = path.startswith('/v2/aggs') and path not in server.seen
+            server.seen.add(path)
+        if rate_limited:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        if path == '/v2/reference/tickers':
+            body = {'status': 'OK', 'page': 1, 'count': len(SYMBOLS), 'tickers': [{'ticker': symbol} for symbol in SYMBOLS]}
+        else:
+            symbol = path.split('/')[4]
+            price = SYMBOLS.index(symbol) + 1
+            body = {'results': [{'t': t, 'o': price, 'c': price, 'h': price, 'l': price, 'v': 100} for t in TIMESTAMPS]}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_server(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPolygonHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.seen = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(data_source.polygon, 'BASE_API_URL', 'http://127.0.0.1:{}'.format(server.server_address[1]))
+    monkeypatch.setattr(util.cache_util, 'CACHE_PATH', str(tmp_path))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_aggregate_symbol_retries_and_caches(stub_server, tmp_path):
+    client = HttpClient(backoff=0)
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    df = get_aggregate_symbol('SYMBOL2', 'day', start, end, 'key', client=client)
+    assert df['t'].tolist() == TIMESTAMPS
+    assert df['c'].tolist() == [2.0, 2.0, 2.0]
+    requests_count = len(stub_server.requests)
+
+    # Served from one columnar cache entry
+    assert [path.suffix for path in tmp_path.iterdir() if not path.name.startswith('cache_index')] == ['.npz']
+    cached_df = get_aggregate_symbol('SYMBOL2', 'day', start, end, 'key', client=client)
+    assert cached_df.equals(df)
+    assert len(stub_server.requests) == requests_count
+
+    # Reading from the cache doesn't import requests
+    statement = '\n'.join([
+        'from datetime import datetime, timezone',
+        'import util.cache_util',
+        'util.cache_util.CACHE_PATH = {!r}'.format(str(tmp_path)),
+        'data_source.polygon.get_aggregate_symbol("SYMBOL2", "day", datetime(2019, 1, 1, tzinfo=timezone.utc), datetime(2019, 1, 3, tzinfo=timezone.utc), "key")',
+    ])
+    _, loaded = measure_import('data_source.polygon', repeat=1, statement=statement)
+    assert 'requests' not in loaded
+    assert len(stub_server.requests) == requests_count
+
+
+def test_get_stocks_aggregate_data_concurrent(stub_server):
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    client = HttpClient(max_connections=3, rate_limit=1000, backoff=0)
+    data = get_stocks_aggregate_data(None, 'stocks', 'day', start, end, 'key', max_workers=3, client=client)
+    assert sorted(data['c'].columns) == SYMBOLS
+    assert data.index.tolist() == TIMESTAMPS
+    assert data['h']['SYMBOL3'].tolist() == [3.0, 3.0, 3.0]
+
+
+def test_get_stocks_aggregate_memmap(stub_server, tmp_path):
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    client = HttpClient(backoff=0)
+    path = str(tmp_path / 'bars')
+    bar_store = get_stocks_aggregate_memmap(path, None, 'stocks', 'day', start, end, 'key', client=client)
+    data = BarStore.from_dataframe(get_stocks_aggregate_data(None, 'stocks', 'day', start, end, 'key', client=client))
+    assert bar_store.symbols == data.symbols
+    assert bar_store.timestamps.tolist() == data.timestamps.tolist()
+    for field in ('o', 'h', 'l', 'c'):
+        assert (bar_store.field(field) == data.field(field)).all()
+    assert not bar_store.c.flags['WRITEABLE']
+
+    # Opened from disk without downloading again
+    requests_count = len(stub_server.requests)
+    get_stocks_aggregate_memmap(path, None, 'stocks', 'day', start, end, 'key', client=client)
+    assert len(stub_server.requests) == requests_count
+
+
+def test_get_stocks_aggregate_memmap_built_concurrently(stub_server, tmp_path, monkeypatch):
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    client = HttpClient(backoff=0)
+    other_path = str(tmp_path / 'other')
+    get_stocks_aggregate_memmap(other_path, None, 'stocks', 'day', start, end, 'key', client=client)
+
+    # Another process moves its store in place while this one downloads
+    path = str(tmp_path / 'bars')
+    get_tickers = data_source.polygon.get_tickers
+    def get_tickers_racing(*args, **kw):
+        shutil.copytree(other_path, path)
+        return get_tickers(*args, **kw)
+    monkeypatch.setattr(data_source.polygon, 'get_tickers', get_tickers_racing)
+
+    bar_store = get_stocks_aggregate_memmap(path, None, 'stocks', 'day', start, end, 'key', client=client)
+    assert bar_store.symbols == SYMBOLS
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')] == []
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1000, capacity=2)
+    for _ in range(10):
+        bucket.acquire()
+    assert bucket.tokens < 1
+
+
+def test_token_bucket_slow_rate():
+    # 5 requests per minute, the first one doesn't wait
+    bucket = TokenBucket(rate=5 / 60)
+    assert bucket.capacity == 1
+    started_at = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started_at < 1
+    with pytest.raises(AssertionError):
+        TokenBucket(rate=5 / 60, capacity=0.5)
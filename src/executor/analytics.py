@@ -0,0 +1,97 @@
+import numpy as np
+
+TRADING_DAYS = 252
+SESSION_SECONDS = 6.5 * 60 * 60
+DAY_SECONDS = 24 * 60 * 60
+YEAR_SECONDS = 365.25 * DAY_SECONDS
+
+
+def _seconds(t):
+    # Seconds since epoch of the t column of a portfolio frame
+    return t.to_numpy(dtype='datetime64[ms]').astype(np.int64) / 1000
+
+
+def get_periods_per_year(seconds):
+    # Bars per year from the median spacing of the bars: trading days for
+    # daily and coarser bars, session time for intraday ones
+    if len(seconds) < 2:
+        return TRADING_DAYS
+    spacing = np.median(np.diff(seconds))
+    if spacing >= DAY_SECONDS:
+        return TRADING_DAYS / round(spacing / DAY_SECONDS)
+    return TRADING_DAYS * SESSION_SECONDS / spacing
+
+
+def analyze(portfolio, periods_per_year=None, risk_free=0.0, value='close'):
+    # Performance metrics of a portfolio frame returned by execute_strategy,
+    # computed with array operations over the whole run. risk_free is the
+    # annual rate. Turnover is the traded value, read from the changes of
+    # cash, over the average portfolio value, and exposure the average share
+    # of the portfolio invested.
+    values = portfolio[value].to_numpy(dtype=np.float64)
+    cash = portfolio['cash'].to_numpy(dtype=np.float64)
+    seconds = _seconds(portfolio['t'])
+    if periods_per_year is None:
+        periods_per_year = get_periods_per_year(seconds)
+
+    returns = values[1:] / values[:-1] - 1
+    excess_returns = returns - risk_free / periods_per_year
+    volatility = returns.std(ddof=1) if len(returns) > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(excess_returns, 0) ** 2)) if len(returns) > 0 else np.nan
+
+    total_return = values[-1] / values[0] - 1
+    years = (seconds[-1] - seconds[0]) / YEAR_SECONDS
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        cagr = (values[-1] / values[0]) ** (1 / years) - 1 if years > 0 else np.nan
+        sharpe = excess_returns.mean() / volatility * np.sqrt(periods_per_year)
+        sortino = excess_returns.mean() / downside * np.sqrt(periods_per_year)
+
+    # Drawdown from the running peak, its duration counts the bars since the
+    # latest peak
+    peak = np.maximum.accumulate(values)
+    drawdown = values / peak - 1
+    bars = np.arange(len(values))
+    last_peak = np.maximum.accumulate(np.where(values >= peak, bars, 0))
+    underwater = bars - last_peak
+    deepest = int(np.argmin(drawdown))
+    longest = int(np.argmax(underwater))
+
+    traded_value = np.abs(np.diff(cash)).sum()
+    invested = values - cash
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = np.nanmean(invested / values)
+
+    return {
+        'total_return': total_return,
+        'cagr': cagr,
+        'volatility': volatility * np.sqrt(periods_per_year),
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': drawdown[deepest],
+        'max_drawdown_at': portfolio['t'].iloc[deepest],
+        'max_drawdown_bars': int(underwater[longest]),
+        'max_drawdown_duration': portfolio['t'].iloc[longest] - portfolio['t'].iloc[last_peak[longest]],
+        'turnover': traded_value / values.mean(),
+        'exposure': exposure,
+        'time_in_market': np.mean(invested != 0),
+        'periods_per_year': periods_per_year,
+    }
+
+
+def downsample_min_max(y, max_points):
+    # Indexes of at most max_points points keeping the lowest and highest
+    # point of every bucket of consecutive points, in order. Peaks and
+    # troughs survive at any length, rendering cost depends on max_points
+    # only.
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= max_points:
+        return np.arange(len(y))
+    buckets = max(max_points // 2, 1)
+    bucket = np.arange(len(y)) * buckets // len(y)
+    # Sorted by bucket then value, the first and last of every bucket are
+    # its min and max
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+    ends = np.r_[starts[1:], len(y)] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
@@ -0,0 +1,130 @@
+import os
+import pickle
+import numpy as np
+from executor.order_history import STATUSES, OrderHistory
+
+# Bump when the content of the checkpoints changes
+CHECKPOINT_VERSION = 2
+
+OPEN = STATUSES.index('open')
+
+
+def rows_to_columns(rows):
+    # Portfolio rows are stored by column, one array per value and the list
+    # of times
+    if len(rows) == 0:
+        return {}
+    return {
+        name: [row[name] for row in rows] if name == 't' else np.array([row[name] for row in rows])
+        for name in rows[0]
+    }
+
+
+def columns_to_rows(columns):
+    names = list(columns)
+    if len(names) == 0:
+        return []
+    values = [columns[name] if name == 't' else columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def save_checkpoint(file_path, checkpoint):
+    # Written to a temporary file first, a crash while saving keeps the
+    # previous checkpoint
+    temp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        pickle.dump(dict(checkpoint, version=CHECKPOINT_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, file_path)
+
+
+def load_checkpoint(file_path):
+    with open(file_path, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise Exception('Checkpoint version not supported {}'.format(checkpoint.get('version')))
+    return checkpoint
+
+
+def get_journal_path(file_path):
+    return '{}.journal'.format(file_path)
+
+
+def remove_checkpoint(file_path):
+    for path in (file_path, get_journal_path(file_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class CheckpointWriter:
+    # Writes the checkpoints of a run. The portfolio rows and the orders that
+    # are no longer open never change, they are appended once to a journal
+    # next to the checkpoint. The checkpoint file holds the cash, the
+    # positions, the open orders and the length of the journal it goes with,
+    # so a checkpoint costs the rows and orders since the previous one.
+    def __init__(self, file_path, journal_size=0, rows=0, orders=None):
+        self.file_path = file_path
+        # Bytes and portfolio rows of the journal
+        self.journal_size = journal_size
+        self.rows = rows
+        # Orders before first_open are in the journal, after it the closed
+        # orders in journaled are
+        self.first_open = 0
+        self.journaled = np.empty(0, dtype=np.int64)
+        if orders is not None:
+            self._track(orders, np.flatnonzero(orders.column('status') != OPEN))
+
+    def _track(self, orders, journaled):
+        is_open = orders.column('status')[self.first_open:] == OPEN
+        self.first_open += int(np.argmax(is_open)) if is_open.any() else len(is_open)
+        journaled = np.union1d(self.journaled, journaled)
+        self.journaled = journaled[journaled >= self.first_open]
+
+    def write(self, state, portfolio_rows, info):
+        orders = state['orders']
+        indexes = np.arange(self.first_open, len(orders))
+        closed = orders.column('status')[self.first_open:] != OPEN
+        new_closed = indexes[closed & ~np.isin(indexes, self.journaled)]
+        chunk = {
+            'portfolio': rows_to_columns(portfolio_rows[self.rows:]),
+            'orders': orders.take(new_closed),
+        }
+        # Anything after journal_size was written after the latest checkpoint
+        # and is overwritten
+        journal_path = get_journal_path(self.file_path)
+        with open(journal_path, 'r+b' if os.path.exists(journal_path) else 'wb') as f:
+            f.truncate(self.journal_size)
+            f.seek(self.journal_size)
+            pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.journal_size = f.tell()
+        self.rows = len(portfolio_rows)
+        self._track(orders, new_closed)
+        save_checkpoint(self.file_path, dict(
+            info,
+            cash=state['cash'],
+            positions=state['positions'],
+            open_orders=orders.take(indexes[~closed]),
+            order_count=len(orders),
+            symbols=orders.symbols,
+            journal_size=self.journal_size,
+            rows=self.rows,
+        ))
+
+
+def restore_checkpoint(file_path, checkpoint):
+    # State of the executor, portfolio rows and writer to continue the
+    # checkpoints of a loaded checkpoint
+    orders = OrderHistory(max(checkpoint['order_count'], 1))
+    orders.symbols = list(checkpoint['symbols'])
+    orders.symbol_codes = {symbol: code for code, symbol in enumerate(orders.symbols)}
+    portfolio_rows = []
+    with open(get_journal_path(file_path), 'rb') as f:
+        while f.tell() < checkpoint['journal_size']:
+            chunk = pickle.load(f)
+            portfolio_rows.extend(columns_to_rows(chunk['portfolio']))
+            orders.put(chunk['orders'])
+    orders.put(checkpoint['open_orders'])
+    if len(orders) != checkpoint['order_count'] or len(portfolio_rows) != checkpoint['rows']:
+        raise Exception('Checkpoint journal {} does not match the checkpoint'.format(get_journal_path(file_path)))
+    state = {'orders': orders, 'positions': checkpoint['positions'], 'cash': checkpoint['cash']}
+    writer = CheckpointWriter(file_path, checkpoint['journal_size'], checkpoint['rows'], orders)
+    return state, portfolio_rows, writer
@@ -0,0 +1,30 @@
+class HistoryWindow:
+    # Rows of the market data seen so far, [start_index, stop_index). The
+    # window is advanced one row per tick and handed to the strategies as an
+    # iloc slice, which is a view on the original frame, so no bisecting or
+    # copying happens per tick. With a lookback only the latest rows are kept
+    # in the window and the slicing cost stays constant on long runs.
+    def __init__(self, data, start_index, lookback=None):
+        assert lookback is None or lookback > 0, 'lookback should be positive {}'.format(lookback)
+        self.data = data
+        self.start_index = start_index
+        self.stop_index = start_index
+        self.lookback = lookback
+
+    def __len__(self):
+        return self.stop_index - self.first_index()
+
+    def first_index(self):
+        if self.lookback is None:
+            return self.start_index
+        return max(self.start_index, self.stop_index - self.lookback)
+
+    def advance(self):
+        self.stop_index += 1
+
+    def advance_to(self, stop_index):
+        assert stop_index >= self.stop_index, 'The window can only grow'
+        self.stop_index = stop_index
+
+    def frame(self):
+        return self.data.iloc[self.first_index():self.stop_index]
@@ -0,0 +1,214 @@
+import numpy as np
+
+
+class RollingWindow:
+    # Last window rows of a field, one column per symbol
+    def __init__(self, window, size):
+        self.values = np.full((window, size), np.nan)
+        self.position = 0
+        self.count = 0
+
+    def push(self, x):
+        # Returns the row leaving the window, NaN while the window fills up
+        leaving = self.values[self.position].copy()
+        self.values[self.position] = x
+        self.position = (self.position + 1) % len(self.values)
+        self.count += 1
+        return leaving
+
+    def full(self):
+        return self.count >= len(self.values)
+
+
+class Indicator:
+    # Updated once per bar with the row of its field for all the symbols.
+    # value is NaN for a symbol until window bars are seen and while the
+    # window contains a missing bar, like pandas rolling windows.
+    def __init__(self, engine, field, window):
+        assert window > 0, 'window should be positive {}'.format(window)
+        self.engine = engine
+        self.field = field
+        self.window = window
+        self.value = None
+
+    def __getitem__(self, symbol):
+        return self.value[self.engine.symbol_index[symbol]]
+
+    def reset(self, size):
+        self.value = np.full(size, np.nan)
+
+    def update(self, x):
+        raise NotImplementedError()
+
+
+class SimpleMovingAverage(Indicator):
+    def reset(self, size):
+        super().reset(size)
+        self.rolling_window = RollingWindow(self.window, size)
+        self.total = np.zeros(size)
+        self.nans = np.zeros(size, dtype=np.int64)
+
+    def update(self, x):
+        leaving = self.rolling_window.push(x)
+        if self.rolling_window.count > self.window:
+            self.total -= np.nan_to_num(leaving)
+            self.nans -= np.isnan(leaving)
+        self.total += np.nan_to_num(x)
+        self.nans += np.isnan(x)
+        valid = (self.nans == 0) & self.rolling_window.full()
+        self.value = np.where(valid, self.total / self.window, np.nan)
+
+
+class ZScore(Indicator):
+    # (x - mean) / std of the window, sample standard deviation
+    def reset(self, size):
+        super().reset(size)
+        self.rolling_window = RollingWindow(self.window, size)
+        self.total = np.zeros(size)
+        self.total_squares = np.zeros(size)
+        self.nans = np.zeros(size, dtype=np.int64)
+
+    def update(self, x):
+        leaving = self.rolling_window.push(x)
+        if self.rolling_window.count > self.window:
+            self.total -= np.nan_to_num(leaving)
+            self.total_squares -= np.nan_to_num(leaving) ** 2
+            self.nans -= np.isnan(leaving)
+        self.total += np.nan_to_num(x)
+        self.total_squares += np.nan_to_num(x) ** 2
+        self.nans += np.isnan(x)
+        mean = self.total / self.window
+        variance = np.maximum(self.total_squares - self.total * mean, 0) / max(self.window - 1, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscore = (x - mean) / np.sqrt(variance)
+        valid = (self.nans == 0) & self.rolling_window.full()
+        self.value = np.where(valid, zscore, np.nan)
+
+
+class ExponentialMovingAverage(Indicator):
+    # Same as pandas ewm(span=window, adjust=False), missing bars keep the
+    # previous value
+    def update(self, x):
+        alpha = 2 / (self.window + 1)
+        value = np.where(np.isnan(self.value), x, self.value + alpha * (x - self.value))
+        self.value = np.where(np.isnan(x), self.value, value)
+
+
+class Returns(Indicator):
+    # Relative change over window bars
+    def reset(self, size):
+        super().reset(size)
+        self.rolling_window = RollingWindow(self.window, size)
+
+    def update(self, x):
+        previous = self.rolling_window.push(x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.value = x / previous - 1
+
+
+class RollingExtreme(Indicator):
+    # Rolling min or max in O(1) amortized per bar (van Herk/Gil-Werman). The
+    # bars are split in blocks of window bars: the window ending at position
+    # p of the current block is the suffix of the previous block after p plus
+    # the prefix of the current block up to p. Suffixes are computed once per
+    # block, prefixes are kept as the bars arrive.
+    function = None
+    identity = None
+
+    def reset(self, size):
+        super().reset(size)
+        self.block = np.full((self.window, size), np.nan)
+        self.previous_block = np.full((self.window, size), np.nan)
+        self.suffix = np.full((self.window + 1, size), self.identity)
+        self.prefix = np.full(size, self.identity)
+        self.position = 0
+        self.count = 0
+        self.nans = np.zeros(size, dtype=np.int64)
+
+    def update(self, x):
+        position = self.position
+        self.block[position] = x
+        self.prefix = x if position == 0 else self.function(self.prefix, x)
+        if self.count >= self.window:
+            self.nans -= np.isnan(self.previous_block[position])
+        self.nans += np.isnan(x)
+        self.count += 1
+        valid = (self.nans == 0) & (self.count >= self.window)
+        self.value = np.where(valid, self.function(self.suffix[position + 1], self.prefix), np.nan)
+
+        self.position += 1
+        if self.position == self.window:
+            self.suffix[:self.window] = self.function.accumulate(self.block[::-1], axis=0)[::-1]
+            self.block, self.previous_block = self.previous_block, self.block
+            self.position = 0
+
+
+class RollingMin(RollingExtreme):
+    function = np.fmin
+    identity = np.inf
+
+
+class RollingMax(RollingExtreme):
+    function = np.fmax
+    identity = -np.inf
+
+
+INDICATORS = {
+    'sma': SimpleMovingAverage,
+    'ema': ExponentialMovingAverage,
+    'min': RollingMin,
+    'max': RollingMax,
+    'returns': Returns,
+    'zscore': ZScore,
+}
+
+
+class IndicatorEngine:
+    # Indicators registered by the strategies of a run. Registering the same
+    # indicator twice returns the same instance, so strategies sharing an
+    # engine share its state. The executor updates every indicator after each
+    # bar, a strategy called at a timestamp sees the indicators of the bars
+    # before it, like its historical data.
+    def __init__(self):
+        self.indicators = {}
+        self.symbols = None
+        self.symbol_index = None
+
+    def register(self, kind, field='c', window=1):
+        assert kind in INDICATORS, 'Indicator not supported {}'.format(kind)
+        assert field in ('o', 'h', 'l', 'c'), 'Field not supported {}'.format(field)
+        key = (kind, field, window)
+        if key not in self.indicators:
+            indicator = INDICATORS[kind](self, field, window)
+            if self.symbols is not None:
+                indicator.reset(len(self.symbols))
+            self.indicators[key] = indicator
+        return self.indicators[key]
+
+    def sma(self, window, field='c'):
+        return self.register('sma', field, window)
+
+    def ema(self, window, field='c'):
+        return self.register('ema', field, window)
+
+    def rolling_min(self, window, field='l'):
+        return self.register('min', field, window)
+
+    def rolling_max(self, window, field='h'):
+        return self.register('max', field, window)
+
+    def returns(self, window=1, field='c'):
+        return self.register('returns', field, window)
+
+    def zscore(self, window, field='c'):
+        return self.register('zscore', field, window)
+
+    def start(self, bar_store):
+        self.symbols = bar_store.symbols
+        self.symbol_index = bar_store.symbol_index
+        for indicator in self.indicators.values():
+            indicator.reset(len(self.symbols))
+
+    def update(self, bar):
+        for indicator in self.indicators.values():
+            indicator.update(bar.store.field(indicator.field)[bar.index])
@@ -0,0 +1,179 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Phases of a tick timed by the executor
+PHASES = ('data_lookup', 'strategy', 'order_matching', 'valuation')
+
+_NULL_PHASE = nullcontext()
+
+
+class NullInstrumentation:
+    # Default of the executor, every hook is a no-op
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def count(self, name, value=1):
+        pass
+
+    def tick(self, **record):
+        pass
+
+    def start_run(self, **info):
+        pass
+
+    def end_run(self):
+        return None
+
+
+class Instrumentation:
+    # Per phase timers and counters of the runs of an executor. Sinks receive
+    # a summary record at the end of every run, and a record per tick when
+    # tick_records is set.
+    enabled = True
+
+    def __init__(self, sinks=(), tick_records=False):
+        self.sinks = list(sinks)
+        self.tick_records = tick_records
+        self.reset()
+
+    def reset(self):
+        self.seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.info = {}
+        self.started_at = None
+        self.total_seconds = 0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def tick(self, **record):
+        self.counters['ticks'] += 1
+        if self.tick_records:
+            record['type'] = 'tick'
+            for sink in self.sinks:
+                sink.emit(record)
+
+    def start_run(self, **info):
+        self.reset()
+        self.info = info
+        for sink in self.sinks:
+            sink.start_run()
+        self.started_at = time.perf_counter()
+
+    def end_run(self):
+        self.total_seconds = time.perf_counter() - self.started_at
+        summary = self.summary()
+        # Every sink adds to the summary before any of them emits it
+        for sink in self.sinks:
+            sink.collect(summary)
+        for sink in self.sinks:
+            sink.end_run(summary)
+        return summary
+
+    def summary(self):
+        total_seconds = self.total_seconds or sum(self.seconds.values())
+        return {
+            'type': 'run',
+            'info': self.info,
+            'total_seconds': total_seconds,
+            'phases': {
+                name: {
+                    'seconds': seconds,
+                    'share': seconds / total_seconds if total_seconds else 0,
+                }
+                for name, seconds in self.seconds.items()
+            },
+            'counters': dict(self.counters),
+            'ticks_per_second': self.counters['ticks'] / total_seconds if total_seconds else 0,
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = ['Run {:.3f}s, {} ticks, {:.1f} ticks/s'.format(summary['total_seconds'], summary['counters'].get('ticks', 0), summary['ticks_per_second'])]
+        # Known phases first, then any other phase timed by the caller
+        for name in list(PHASES) + sorted(set(summary['phases']) - set(PHASES)):
+            if name in summary['phases']:
+                lines.append('  {:<15} {:>10.3f}s {:>6.1%}'.format(name, summary['phases'][name]['seconds'], summary['phases'][name]['share']))
+        for name, value in sorted(summary['counters'].items()):
+            lines.append('  {:<15} {:>10}'.format(name, value))
+        return '\n'.join(lines)
+
+
+class Sink:
+    def start_run(self):
+        pass
+
+    def collect(self, summary):
+        pass
+
+    def emit(self, record):
+        pass
+
+    def end_run(self, summary):
+        self.emit(summary)
+
+
+class MemorySink(Sink):
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class JsonLinesSink(Sink):
+    # Appends one JSON object per record to path
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def start_run(self):
+        self.file = open(self.path, 'a')
+
+    def emit(self, record):
+        self.file.write(json.dumps(record, default=str))
+        self.file.write('\n')
+
+    def end_run(self, summary):
+        self.emit(summary)
+        self.file.close()
+        self.file = None
+
+
+class CProfileSink(Sink):
+    # Profiles the whole run with cProfile, the stats are dumped to path when
+    # given and the top functions are added to the run summary
+    def __init__(self, path=None, top=20, sort='cumulative'):
+        self.path = path
+        self.top = top
+        self.sort = sort
+        self.profile = None
+        self.stats = None
+
+    def start_run(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def collect(self, summary):
+        self.profile.disable()
+        if self.path is not None:
+            self.profile.dump_stats(self.path)
+        output = io.StringIO()
+        self.stats = pstats.Stats(self.profile, stream=output)
+        self.stats.sort_stats(self.sort).print_stats(self.top)
+        summary['profile'] = output.getvalue()
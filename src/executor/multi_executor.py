@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from executor.simple_executor import SimpleExecutor
+from executor.history_window import HistoryWindow
+from executor.indicators import IndicatorEngine
+
+
+class MultiStrategyExecutor:
+    # Runs several strategies in a single pass over the market data. Each
+    # strategy has its own SimpleExecutor, so cash, orders and positions are
+    # isolated, while the bar row, the historical data and the indicators of
+    # every tick are computed once and shared by all of them. Strategies must
+    # not modify the historical data they receive.
+    def __init__(self, strategies):
+        # strategies maps a name to the strategy, the same names are used to
+        # index the executors and the results
+        self.strategies = strategies
+        self.indicators = IndicatorEngine()
+        self.executors = {name: SimpleExecutor(self.indicators) for name in strategies}
+
+    def reset(self):
+        for executor in self.executors.values():
+            executor.reset()
+
+    def set_cash(self, cash):
+        for executor in self.executors.values():
+            executor.set_cash(cash)
+
+    def execute_strategies(self, data, start, end, lookback=None):
+        assert start.tzinfo is not None, 'The start date should be timezone aware'
+        assert end.tzinfo is not None, 'The end date should be timezone aware'
+
+        portfolio_data = {name: [] for name in self.strategies}
+
+        loader = SimpleExecutor()
+        data, bar_store = loader.load_data(data)
+        for executor in self.executors.values():
+            executor.start_run(bar_store)
+        self.indicators.start(bar_store)
+
+        try:
+            # Rows in the interval
+            index_start, index_end = loader.interval_indexes(data, start, end)
+            history = HistoryWindow(data, index_start, lookback)
+
+            for index in range(index_start, index_end + 1):
+                timestamp_ms = int(bar_store.timestamps[index])
+                utc_t = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+                history.advance_to(index)
+                historical_data = history.frame() if len(history) > 0 else None
+                latest_interval = bar_store.row_at(index)
+
+                for name, strategy in self.strategies.items():
+                    portfolio_data[name].append(
+                        self.executors[name].run_tick(strategy, utc_t, historical_data, latest_interval)
+                    )
+                self.indicators.update(latest_interval)
+        finally:
+            for executor in self.executors.values():
+                executor.finish_run()
+
+        # One portfolio frame per strategy
+        from pandas import DataFrame
+        return {name: DataFrame(rows) for name, rows in portfolio_data.items()}
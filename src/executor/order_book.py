@@ -0,0 +1,115 @@
+import numpy as np
+
+SIDES = ('buy', 'sell')
+TYPES = ('market', 'limit', 'stop', 'stop_limit')
+
+BUY = SIDES.index('buy')
+SELL = SIDES.index('sell')
+MARKET = TYPES.index('market')
+LIMIT = TYPES.index('limit')
+STOP = TYPES.index('stop')
+STOP_LIMIT = TYPES.index('stop_limit')
+
+DAY_US = 24 * 60 * 60 * 1000 * 1000
+
+COLUMNS = (
+    ('symbol', np.int64),
+    ('side', np.int8),
+    ('type', np.int8),
+    ('limit_price', np.float64),
+    ('stop_price', np.float64),
+    # Microseconds since epoch
+    ('created_at', np.int64),
+    # Orders with time_in_force day expire one day after creation
+    ('expires', np.bool_),
+)
+
+
+def _to_us(time):
+    return round(time.timestamp() * 1000000)
+
+
+def _price(price):
+    return np.nan if price is None else price
+
+
+class OrderBook:
+    # Keeps only the open orders, one array per attribute, so that a bar can
+    # be matched against all of them with a handful of vectorized operations.
+    # The order dicts are kept aligned with the columns and are what gets
+    # handed back to the executor.
+    def __init__(self, symbol_index, capacity=1024):
+        self.symbol_index = symbol_index
+        self.orders = []
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def _grow(self):
+        capacity = 2 * len(self.columns['symbol'])
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:len(self.orders)] = column[:len(self.orders)]
+            self.columns[name] = grown
+
+    def add(self, order):
+        assert order['status'] == 'open'
+        if len(self.orders) == len(self.columns['symbol']):
+            self._grow()
+        index = len(self.orders)
+        self.columns['symbol'][index] = self.symbol_index[order['symbol']]
+        self.columns['side'][index] = SIDES.index(order['side'])
+        self.columns['type'][index] = TYPES.index(order['type'])
+        self.columns['limit_price'][index] = _price(order['limit_price'])
+        self.columns['stop_price'][index] = _price(order['stop_price'])
+        self.columns['created_at'][index] = _to_us(order['created_at'])
+        self.columns['expires'][index] = order['time_in_force'] == 'day'
+        self.orders.append(order)
+
+    def match(self, time, high, low):
+        # Returns the (order, price) pairs decided on this bar in the order
+        # they were placed. A price of None means the order expired.
+        n = len(self.orders)
+        if n == 0:
+            return []
+        columns = {name: column[:n] for name, column in self.columns.items()}
+        side = columns['side']
+        type = columns['type']
+        limit_price = columns['limit_price']
+        stop_price = columns['stop_price']
+        order_high = high[columns['symbol']]
+        order_low = low[columns['symbol']]
+        buy = side == BUY
+        sell = side == SELL
+
+        expired = columns['expires'] & (_to_us(time) - columns['created_at'] >= DAY_US)
+
+        # Comparisons against NaN are False, so limit and stop orders on a
+        # symbol without a bar stay open
+        limit_hit = (buy & (limit_price > order_low)) | (sell & (limit_price < order_high))
+        stop_hit = (buy & (order_high > stop_price)) | (sell & (order_low < stop_price))
+
+        market = type == MARKET
+        limit = (type == LIMIT) & limit_hit
+        stop = (type == STOP) & stop_hit
+        stop_limit = (type == STOP_LIMIT) & stop_hit & limit_hit
+        filled = ~expired & (market | limit | stop | stop_limit)
+
+        price = np.where(buy, order_high, order_low)
+        price = np.where(limit | stop_limit, limit_price, price)
+        price = np.where(stop, stop_price, price)
+
+        decided = np.flatnonzero(expired | filled)
+        if len(decided) == 0:
+            return []
+        events = [
+            (self.orders[index], float(price[index]) if filled[index] else None)
+            for index in decided
+        ]
+
+        keep = np.flatnonzero(~(expired | filled))
+        for name, column in self.columns.items():
+            column[:len(keep)] = column[keep]
+        self.orders = [self.orders[index] for index in keep]
+        return events
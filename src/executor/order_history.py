@@ -0,0 +1,186 @@
+from collections.abc import MutableMapping, Sequence
+import numpy as np
+from executor.order_book import SIDES, TYPES
+from util.math_util import as_quantity
+
+TIMES_IN_FORCE = ('day', 'gtc', 'opg', 'cls', 'ioc', 'fok')
+STATUSES = ('open', 'filled', 'expired', 'canceled')
+
+# Name and kind of every order field. Codes are stored as the index in their
+# tuple, times keep a reference to the datetime passed by the executor, which
+# is shared by all the orders of a tick.
+FIELDS = (
+    ('symbol', 'symbol'),
+    ('qty', 'quantity'),
+    ('side', SIDES),
+    ('type', TYPES),
+    ('time_in_force', TIMES_IN_FORCE),
+    ('limit_price', 'price'),
+    ('stop_price', 'price'),
+    ('extended_hours', 'bool'),
+    ('client_order_id', 'object'),
+    ('status', STATUSES),
+    ('created_at', 'object'),
+    ('submitted_at', 'object'),
+    ('filled_qty', 'quantity'),
+    ('filled_avg_price', 'number'),
+    ('filled_at', 'object'),
+    ('expired_at', 'object'),
+    ('canceled_at', 'object'),
+)
+
+FIELD_BITS = {name: 1 << bit for bit, (name, kind) in enumerate(FIELDS)}
+FIELD_KINDS = dict(FIELDS)
+
+DTYPES = {
+    'symbol': np.int32,
+    'number': np.float64,
+    'quantity': np.float64,
+    'price': np.float64,
+    'bool': np.bool_,
+    'object': object,
+}
+
+
+class Order(MutableMapping):
+    # Dict-like view of an order of an OrderHistory, only the fields that were
+    # set are keys, like the order dicts the executor used to keep
+    __slots__ = ('history', 'index')
+
+    def __init__(self, history, index):
+        self.history = history
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.history.get(self.index, name)
+
+    def __setitem__(self, name, value):
+        self.history.set(self.index, name, value)
+
+    def __delitem__(self, name):
+        raise TypeError('Order fields can not be removed')
+
+    def __iter__(self):
+        present = self.history.present[self.index]
+        return (name for name, kind in FIELDS if present & FIELD_BITS[name])
+
+    def __len__(self):
+        return bin(self.history.present[self.index]).count('1')
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class OrderHistory(Sequence):
+    # All the orders of an executor, one array per field instead of a dict per
+    # order. Behaves like the list of orders it replaces: append takes an
+    # order dict and indexing or iterating returns Order views, which can be
+    # updated in place.
+    def __init__(self, capacity=1024):
+        self.symbols = []
+        self.symbol_codes = {}
+        self.count = 0
+        self.present = np.zeros(capacity, dtype=np.int32)
+        self.columns = {name: self._column(kind, capacity) for name, kind in FIELDS}
+
+    def _column(self, kind, capacity):
+        return np.empty(capacity, dtype=np.int8 if isinstance(kind, tuple) else DTYPES[kind])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Order(self, i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('Order index out of range {}'.format(index))
+        return Order(self, index)
+
+    def __getstate__(self):
+        # Only the used part of the arrays is pickled
+        state = self.__dict__.copy()
+        state['present'] = self.present[:self.count].copy()
+        state['columns'] = {name: column[:self.count].copy() for name, column in self.columns.items()}
+        return state
+
+    def _grow(self, capacity=None):
+        capacity = max(capacity or 0, 2 * len(self.present), 1)
+        present = np.zeros(capacity, dtype=np.int32)
+        present[:self.count] = self.present[:self.count]
+        self.present = present
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            self.columns[name] = grown
+
+    def append(self, order):
+        unknown = set(order) - set(FIELD_KINDS)
+        assert len(unknown) == 0, 'Order fields not supported {}'.format(unknown)
+        if self.count == len(self.present):
+            self._grow()
+        index = self.count
+        self.count += 1
+        self.present[index] = 0
+        for name, value in order.items():
+            self.set(index, name, value)
+
+    def set(self, index, name, value):
+        kind = FIELD_KINDS[name]
+        if kind == 'symbol':
+            if value not in self.symbol_codes:
+                self.symbol_codes[value] = len(self.symbols)
+                self.symbols.append(value)
+            value = self.symbol_codes[value]
+        elif isinstance(kind, tuple):
+            value = kind.index(value)
+        elif kind == 'price' and value is None:
+            value = np.nan
+        self.columns[name][index] = value
+        self.present[index] |= FIELD_BITS[name]
+
+    def get(self, index, name):
+        if not self.present[index] & FIELD_BITS.get(name, 0):
+            raise KeyError(name)
+        kind = FIELD_KINDS[name]
+        value = self.columns[name][index]
+        if kind == 'symbol':
+            return self.symbols[value]
+        if isinstance(kind, tuple):
+            return kind[value]
+        if kind == 'price':
+            return None if np.isnan(value) else float(value)
+        if kind == 'object':
+            return value
+        if kind == 'quantity':
+            return as_quantity(value)
+        return value.item()
+
+    def column(self, name):
+        # Raw values of a field for all the orders, codes for symbols and
+        # enumerations
+        return self.columns[name][:self.count]
+
+    def take(self, indexes):
+        # Raw fields of the orders at indexes, to be written back with put.
+        # Symbols are stored as codes, valid for any later state of the
+        # history since symbols are only ever added.
+        indexes = np.asarray(indexes, dtype=np.int64)
+        return {
+            'indexes': indexes,
+            'present': self.present[indexes],
+            'columns': {name: column[indexes] for name, column in self.columns.items()},
+        }
+
+    def put(self, rows):
+        indexes = rows['indexes']
+        if len(indexes) == 0:
+            return
+        count = max(self.count, int(indexes.max()) + 1)
+        if count > len(self.present):
+            self._grow(count)
+        self.count = count
+        self.present[indexes] = rows['present']
+        for name, column in rows['columns'].items():
+            self.columns[name][indexes] = column
@@ -0,0 +1,109 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from executor.history_window import HistoryWindow
+from executor.indicators import IndicatorEngine
+from executor.position_book import PositionBook
+from util.bar_store import BarStore
+
+
+def split_rows(index_start, index_end, chunks):
+    # [(first, last)] rows of every chunk, inclusive, sizes differ by one at
+    # most
+    bounds = np.linspace(index_start, index_end + 1, min(chunks, index_end + 1 - index_start) + 1).astype(np.int64)
+    return [(int(first), int(next_first) - 1) for first, next_first in zip(bounds[:-1], bounds[1:])]
+
+
+def _request_orders(strategy, bar_store_path, index_start, first, last, warmup, lookback, cash):
+    # Runs in the worker process. Calls the strategy on rows [first, last] and
+    # records its order requests instead of executing them. The indicators
+    # and the historical data are built from the warmup rows before first.
+    bar_store = BarStore.load(bar_store_path)
+    data = bar_store.to_frame()
+    indicators = getattr(strategy, 'indicators', None) or IndicatorEngine()
+    indicators.start(bar_store)
+    warmup_index = first if warmup is None else max(index_start, first - warmup)
+    history = HistoryWindow(data, warmup_index, lookback)
+    positions = PositionBook()
+    requests = []
+
+    for index in range(warmup_index, last + 1):
+        latest_interval = bar_store.row_at(index)
+        history.advance_to(index)
+        if index >= first and index > index_start and len(history) > 0:
+            utc_t = datetime.fromtimestamp(int(bar_store.timestamps[index]) / 1000, timezone.utc)
+            request_new_order = lambda *args, **kw: requests.append((index, args, kw))
+            strategy(utc_t, request_new_order, history.frame(), latest_interval['o'], positions, cash)
+        indicators.update(latest_interval)
+    return requests
+
+
+def execute_strategy_partitioned(executor, strategy, data, start, end, chunks=None, max_workers=None, warmup=None):
+    # Runs strategy like executor.execute_strategy, with the date range split
+    # in chunks whose strategy calls run in parallel worker processes.
+    #
+    # A window-bounded strategy declares a lookback attribute: its decisions
+    # only depend on the latest lookback rows of historical data and on the
+    # indicators of its indicators attribute, whose windows should fit in the
+    # lookback, never on positions or cash. Each chunk then warms up on the
+    # lookback rows before it and requests the same orders as a serial run.
+    # Workers record the order requests, and a second pass replays them in
+    # time order through the executor, which matches the orders and carries
+    # cash and positions from chunk to chunk, raising as usual when cash
+    # goes below zero. The result is the same as execute_strategy(strategy,
+    # data, start, end, lookback=lookback) on an executor sharing the
+    # indicators of the strategy.
+    #
+    # Other strategies run serially, unless warmup rows are given: the chunks
+    # then see warmup rows of history, and positions and cash from an empty
+    # portfolio, so the result is an approximation.
+    #
+    # The strategy must be picklable, e.g. a module level function or an
+    # instance of a module level class.
+    lookback = getattr(strategy, 'lookback', None)
+    if lookback is None and warmup is None:
+        return executor.execute_strategy(strategy, data, start, end)
+    if lookback is not None:
+        warmup = lookback
+
+    # Workers map the directory of a path or of a loaded store, only a store
+    # in memory is written to a temporary one
+    path = data if isinstance(data, (str, os.PathLike)) else None
+    data, bar_store = executor.load_data(data)
+    if path is None:
+        path = bar_store.path
+    index_start, index_end = executor.interval_indexes(data, start, end)
+    chunks = chunks or max_workers or os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        if path is None:
+            path = temp_path
+            bar_store.save(path)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_request_orders, strategy, path, index_start, first, last, warmup, lookback, executor.state['cash'])
+                for first, last in split_rows(index_start, index_end, chunks)
+            ]
+            requests = [request for future in futures for request in future.result()]
+
+    # Second pass, chunks are in time order so the requests of a row keep
+    # the order the strategy made them in
+    requests_by_index = {}
+    for index, args, kw in requests:
+        requests_by_index.setdefault(index, []).append((args, kw))
+
+    portfolio_data = []
+    executor.start_run(bar_store)
+    try:
+        for index in range(index_start, index_end + 1):
+            utc_t = datetime.fromtimestamp(int(bar_store.timestamps[index]) / 1000, timezone.utc)
+            for args, kw in requests_by_index.get(index, ()):
+                executor.request_new_order(utc_t, *args, **kw)
+            portfolio_data.append(executor.settle_tick(utc_t, bar_store.row_at(index)))
+    finally:
+        executor.finish_run()
+
+    from pandas import DataFrame
+    return DataFrame(portfolio_data)
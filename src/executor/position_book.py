@@ -0,0 +1,195 @@
+from collections.abc import Mapping
+import os
+import binascii
+import numpy as np
+from util.math_util import as_quantity
+
+# Position fields that the executor doesn't compute
+UNSUPPORTED_FIELDS = (
+    'unrealized_intraday_pl',
+    'unrealized_intraday_plpc',
+    'lastday_price',
+    'change_today',
+)
+
+POSITION_FIELDS = (
+    'asset_id',
+    'symbol',
+    'exchange',
+    'asset_class',
+    'avg_entry_price',
+    'qty',
+    'side',
+    'market_value',
+    'cost_basis',
+    'unrealized_pl',
+    'unrealized_plpc',
+    'current_price',
+) + UNSUPPORTED_FIELDS
+
+# Vectors of the book, one value per symbol
+VECTORS = (
+    ('qty', np.float64, 0),
+    # Signed, negative for short positions
+    ('cost_basis', np.float64, 0),
+    # Latest known close, NaN until the symbol has a bar
+    ('current_price', np.float64, np.nan),
+    ('traded', np.bool_, False),
+)
+
+
+def _value(x):
+    x = x.item()
+    return None if x != x else x
+
+
+class Position(Mapping):
+    # Read-only dict-like view of the position of a symbol. qty is the
+    # absolute quantity and side its sign, a symbol without a position has
+    # qty 0. Prices and values are computed from the vectors of the book when
+    # read, they are None until the symbol is traded and has a price.
+    __slots__ = ('book', 'symbol')
+
+    def __init__(self, book, symbol):
+        self.book = book
+        self.symbol = symbol
+
+    def __getitem__(self, name):
+        book = self.book
+        index = book.symbol_index.get(self.symbol)
+        traded = index is not None and book.traded[index]
+        if name == 'symbol':
+            return self.symbol
+        if name == 'qty':
+            return as_quantity(abs(book.qty[index])) if traded else 0
+        if name == 'side':
+            return 'short' if traded and book.qty[index] < 0 else 'long'
+        if name == 'asset_id':
+            return book.asset_ids.get(self.symbol)
+        if name == 'exchange':
+            return 'NASDAQ'
+        if name == 'asset_class':
+            return 'us_equity'
+        if name in UNSUPPORTED_FIELDS:
+            return None
+        if name not in POSITION_FIELDS:
+            raise KeyError(name)
+        if not traded:
+            return None
+        qty = book.qty[index]
+        cost_basis = book.cost_basis[index]
+        market_value = qty * book.current_price[index]
+        if name == 'cost_basis':
+            return _value(cost_basis)
+        if name == 'current_price':
+            return _value(book.current_price[index])
+        if name == 'market_value':
+            return _value(market_value)
+        if name == 'avg_entry_price':
+            return _value(cost_basis / qty) if qty != 0 else None
+        if name == 'unrealized_pl':
+            return _value(market_value - cost_basis)
+        if name == 'unrealized_plpc':
+            return _value((market_value - cost_basis) / abs(cost_basis)) if cost_basis != 0 else None
+
+    def __iter__(self):
+        return iter(POSITION_FIELDS)
+
+    def __len__(self):
+        return len(POSITION_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class PositionBook(Mapping):
+    # Signed quantity, cost basis and price of every symbol in dense vectors.
+    # The vectors are aligned with the columns of the bar store that values
+    # them, so that a bar row can be combined with them directly. As a
+    # mapping it is read-only and contains the symbols that were traded,
+    # indexing another symbol returns an empty position.
+    def __init__(self, capacity=64):
+        self.symbol_index = {}
+        self.symbols = []
+        # Symbols of the bar store the vectors are aligned with
+        self.aligned_to = None
+        self.asset_ids = {}
+        for name, dtype, fill in VECTORS:
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+
+    def _resize(self, capacity, indexes=None):
+        # Moves the value at indexes[i] to i, indexes -1 are new symbols
+        for name, dtype, fill in VECTORS:
+            vector = getattr(self, name)
+            resized = np.full(capacity, fill, dtype=dtype)
+            if indexes is None:
+                resized[:len(self.symbols)] = vector[:len(self.symbols)]
+            else:
+                known = indexes >= 0
+                resized[:len(indexes)][known] = vector[indexes[known]]
+            setattr(self, name, resized)
+
+    def _add_symbol(self, symbol):
+        if len(self.symbols) == len(self.qty):
+            self._resize(max(2 * len(self.qty), 1))
+        self.symbol_index[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        return self.symbol_index[symbol]
+
+    def align(self, symbols):
+        # Orders the vectors like symbols, the symbols held that are not in
+        # symbols are kept after them
+        known = set(symbols)
+        order = list(symbols) + [symbol for symbol in self.symbols if symbol not in known]
+        indexes = np.array([self.symbol_index.get(symbol, -1) for symbol in order], dtype=np.int64)
+        self._resize(max(len(order), len(self.qty)), indexes)
+        self.symbols = order
+        self.symbol_index = {symbol: index for index, symbol in enumerate(order)}
+        self.aligned_to = symbols
+
+    def add(self, symbol, delta_qty, price=np.nan):
+        # Cost basis grows with the price of the fill when the position
+        # increases, shrinks by the same fraction as the quantity when it
+        # decreases, and restarts at the price of the fill when it flips side
+        index = self.symbol_index.get(symbol)
+        if index is None:
+            index = self._add_symbol(symbol)
+        if not self.traded[index]:
+            self.traded[index] = True
+            self.asset_ids[symbol] = binascii.hexlify(os.urandom(8))
+        qty = self.qty[index]
+        new_qty = qty + delta_qty
+        if qty == 0 or (qty > 0) == (delta_qty > 0):
+            self.cost_basis[index] += delta_qty * price
+        elif new_qty == 0 or (new_qty > 0) == (qty > 0):
+            self.cost_basis[index] *= new_qty / qty
+        else:
+            self.cost_basis[index] = new_qty * price
+        self.qty[index] = new_qty
+
+    def vector(self, size):
+        # Signed quantities of the first size symbols, a view
+        return self.qty[:size]
+
+    def mark(self, prices, symbols=None):
+        # Updates the current price of the symbols at the given indexes, by
+        # default the first len(prices), missing prices keep the previous one
+        if symbols is None or isinstance(symbols, slice):
+            current_price = self.current_price[:len(prices)]
+            np.copyto(current_price, prices, where=~np.isnan(prices))
+        else:
+            valid = ~np.isnan(prices)
+            self.current_price[symbols[valid]] = prices[valid]
+
+    def __getitem__(self, symbol):
+        return Position(self, symbol)
+
+    def __contains__(self, symbol):
+        index = self.symbol_index.get(symbol)
+        return index is not None and bool(self.traded[index])
+
+    def __iter__(self):
+        return (self.symbols[index] for index in np.flatnonzero(self.traded[:len(self.symbols)]))
+
+    def __len__(self):
+        return int(self.traded[:len(self.symbols)].sum())
@@ -1,14 +1,28 @@
 import calendar
-from datetime import datetime
-from pytz import timezone, utc
-from collections import defaultdict
-from pandas import DataFrame
-import matplotlib.pyplot as plt
+import logging
+from datetime import datetime, timezone
 from bisect import bisect_left, bisect_right
-from util.dataframe_util import get_values_at_timestamp
-import os
-import binascii
+from util.bar_store import BarRow, BarStore
 from util.math_util import force_finite
+from util.resample import get_rollup, resample_bar_store
+from executor.order_book import OrderBook
+from executor.history_window import HistoryWindow
+from executor.indicators import IndicatorEngine
+from executor.instrumentation import NullInstrumentation
+from executor.order_history import OrderHistory
+from executor.position_book import PositionBook
+from executor.checkpoint import CheckpointWriter, load_checkpoint, remove_checkpoint, restore_checkpoint
+from executor.analytics import downsample_min_max
+import os
+import numpy as np
+
+# pandas, pytz and matplotlib are imported when used, importing the executor
+# stays cheap for the worker processes of sweeps and partitioned runs
+
+logger = logging.getLogger(__name__)
+
+# Points drawn at most by plot
+PLOT_MAX_POINTS = 2000
 
 class SimpleExecutor:
     # Orders should follow this format
@@ -56,23 +70,27 @@ class SimpleExecutor:
     #     "lastday_price": 119.0,
     #     "change_today": 0.0084
     # }
-    def __init__(self):
+    def __init__(self, indicators=None, instrumentation=None):
+        # Indicators registered by the strategies, updated after every bar
+        self.indicators = indicators or IndicatorEngine()
+        # Timers and counters of the runs, disabled by default
+        self.instrumentation = instrumentation or NullInstrumentation()
+        # Summary of the latest run when instrumentation is enabled
+        self.run_summary = None
         self.reset()
 
     def reset(self):
         self.state = {
-            # All orders
-            'orders': [],
-            # All positions index by symbol
-            'positions': defaultdict(lambda: {
-                'asset_id': binascii.hexlify(os.urandom(8)),
-                'exchange': 'NASDAQ',
-                'asset_class': 'us_equity',
-                'qty': 0
-            }),
+            # All orders, stored by field
+            'orders': OrderHistory(),
+            # All positions, a quantity vector with a read-only mapping view
+            # indexed by symbol
+            'positions': PositionBook(),
             # Initial cash
             'cash': 0,
         }
+        # Open orders indexed for vectorized matching while a strategy runs
+        self.order_book = None
 
     def set_cash(self, cash):
         self.state['cash'] = cash
@@ -82,8 +100,10 @@ class SimpleExecutor:
         if side in ('sell'):
             raise NotImplementedError()
         assert type in ('market', 'limit', 'stop', 'stop_limit')
-        if type in ('limit', 'stop', 'stop_limit'):
-            raise NotImplementedError()
+        if type in ('limit', 'stop_limit'):
+            assert limit_price is not None, '{} order without limit_price'.format(type)
+        if type in ('stop', 'stop_limit'):
+            assert stop_price is not None, '{} order without stop_price'.format(type)
         assert time_in_force in ('day', 'gtc', 'opg', 'cls', 'ioc', 'fok')
         if time_in_force in ('opg', 'cls', 'ioc', 'fok'):
             raise NotImplementedError()
@@ -103,13 +123,18 @@ class SimpleExecutor:
             'submitted_at': time,
             'filled_qty': 0
         }
-        print('{now} New order issued {symbol} {qty}'.format(
-            **order_dict,
-            now=time.astimezone(timezone('US/Eastern')
-                                ).strftime("%Y-%m-%d %H:%M:%S %Z%z")
-        ))
+        if logger.isEnabledFor(logging.INFO):
+            import pytz
+            logger.info('%s New order issued %s %s',
+                time.astimezone(pytz.timezone('US/Eastern')).strftime("%Y-%m-%d %H:%M:%S %Z%z"),
+                symbol,
+                qty,
+                extra={'event': 'order', 'order': order_dict})
+        self.instrumentation.count('orders_requested')
 
         self.state['orders'].append(order_dict)
+        if self.order_book is not None:
+            self.order_book.add(self.state['orders'][-1])
 
     def check_orders_execution(self, time, interval_data):
         for order in self.state['orders']:
@@ -133,9 +158,30 @@ class SimpleExecutor:
                     self.execute_order(time, order, order['limit_price'])
                 if order['side'] == 'sell' and order['limit_price'] < high:
                     self.execute_order(time, order, order['limit_price'])
+            if order['type'] == 'stop':
+                if order['side'] == 'buy' and high > order['stop_price']:
+                    self.execute_order(time, order, order['stop_price'])
+                if order['side'] == 'sell' and low < order['stop_price']:
+                    self.execute_order(time, order, order['stop_price'])
+            if order['type'] == 'stop_limit':
+                if order['side'] == 'buy' and high > order['stop_price'] and order['limit_price'] > low:
+                    self.execute_order(time, order, order['limit_price'])
+                if order['side'] == 'sell' and low < order['stop_price'] and order['limit_price'] < high:
+                    self.execute_order(time, order, order['limit_price'])
+
+    def match_open_orders(self, time, bar):
+        # Same decisions as check_orders_execution, taken for all the open
+        # orders at once by the order book
+        for order, price in self.order_book.match(time, bar['h'].values, bar['l'].values):
+            if price is None:
+                self.expire_order(time, order)
+            else:
+                self.execute_order(time, order, price)
 
     def execute_order(self, time, order, price):
-        print('Execute order {client_order_id} at {price}'.format(**order, price=price))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('Execute order %s at %s', order['client_order_id'], price, extra={'event': 'fill', 'order': order, 'price': price})
+        self.instrumentation.count('orders_filled')
         order['status'] = 'filled'
         order['filled_avg_price'] = price
         order['filled_at'] = time
@@ -143,12 +189,13 @@ class SimpleExecutor:
 
         if order['side'] == 'buy':
             self.state['cash'] -= price * order['qty']
-            self.update_position(order['symbol'], order['qty'])
+            self.update_position(order['symbol'], order['qty'], price)
         if order['side'] == 'sell':
             self.state['cash'] += price * order['qty']
-            self.update_position(order['symbol'], -order['qty'])
+            self.update_position(order['symbol'], -order['qty'], price)
 
-        print('Cash remaining {cash}'.format(**self.state))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Cash remaining %s', self.state['cash'], extra={'event': 'cash', 'cash': self.state['cash']})
 
         if self.state['cash'] < 0:
             raise Exception('Cash is below zero')
@@ -158,42 +205,56 @@ class SimpleExecutor:
         order['canceled_at'] = time
 
     def expire_order(self, time, order):
+        self.instrumentation.count('orders_expired')
         order['status'] = 'expired'
         order['expired_at'] = time
 
-    def update_position(self, symbol, delta_qty):
-        position = self.state['positions'][symbol]
-        position['symbol'] = symbol
-        qty = position['qty'] + delta_qty
-        position['qty'] = abs(qty)
-        position['side'] = 'long' if qty >= 0 else 'short'
-
-        # Unsupported attributes - this are not relevant for simple analysis
-        position['avg_entry_price'] = None
-        position['market_value'] = None
-        position['cost_basis'] = None
-        position['unrealized_pl'] = None
-        position['unrealized_plpc'] = None
-        position['unrealized_intraday_pl'] = None
-        position['unrealized_intraday_plpc'] = None
-        position['current_price'] = None
-        position['lastday_price'] = None
-        position['change_today'] = None
+    def update_position(self, symbol, delta_qty, price=np.nan):
+        self.state['positions'].add(symbol, delta_qty, price)
 
     def portfolio_value(self, last_interval):
-        high = 0
-        low = 0
-        open = 0
-        close = 0
-        for symbol in self.state['positions']:
-            high += force_finite(last_interval['h'][symbol]) * self.state['positions'][symbol]['qty']
-            low += force_finite(last_interval['l'][symbol]) * self.state['positions'][symbol]['qty']
-            open += force_finite(last_interval['o'][symbol]) * self.state['positions'][symbol]['qty']
-            close += force_finite(last_interval['c'][symbol]) * self.state['positions'][symbol]['qty']
+        # last_interval is a row of a bar store, or like check_orders_execution
+        # any mapping field -> symbol -> price such as get_values_at_timestamp
+        # returns. The position vector is aligned with the columns of a bar
+        # store, so each field is valued with a single dot product. Like the
+        # position qty the absolute quantity is used, and missing prices count
+        # as 0.
+        if not isinstance(last_interval, BarRow):
+            return self.portfolio_value_mapping(last_interval)
+        positions = self.state['positions']
+        store = last_interval.store
+        if positions.aligned_to is not store.symbols:
+            positions.align(store.symbols)
+        qty = np.abs(positions.vector(len(store.symbols)))
+        # With an active index only the symbols with a bar are read, the
+        # others have no price and count as 0
+        active = store.active_at(last_interval.index) if store.active_ptr is not None else slice(None)
+        qty = qty[active]
+        held = qty != 0
+        values = {}
+        for column, field in (('high', 'h'), ('low', 'l'), ('open', 'o'), ('close', 'c')):
+            prices = store.field(field)[last_interval.index, active]
+            values[column] = float(np.dot(np.where(held & ~np.isnan(prices), prices, 0), qty))
+        # Prices of the position fields, market value and unrealized P&L are
+        # derived from it when read
+        positions.mark(prices, active)
         cash = self.state['cash']
-        return dict(high=high + cash, low=low + cash, open=open + cash, close=close + cash, cash=cash)
+        return dict(high=values['high'] + cash, low=values['low'] + cash, open=values['open'] + cash, close=values['close'] + cash, cash=cash)
 
-    def filter_data(self, data, start, end, include_end=True):
+    def portfolio_value_mapping(self, last_interval):
+        # Same values looked up symbol by symbol
+        positions = self.state['positions']
+        symbols = list(positions)
+        values = {}
+        for column, field in (('high', 'h'), ('low', 'l'), ('open', 'o'), ('close', 'c')):
+            values[column] = float(sum(force_finite(last_interval[field][symbol]) * positions[symbol]['qty'] for symbol in symbols))
+        if len(symbols) > 0:
+            prices = np.array([last_interval['c'][symbol] for symbol in symbols], dtype=np.float64)
+            positions.mark(prices, np.array([positions.symbol_index[symbol] for symbol in symbols]))
+        cash = self.state['cash']
+        return dict(high=values['high'] + cash, low=values['low'] + cash, open=values['open'] + cash, close=values['close'] + cash, cash=cash)
+
+    def interval_indexes(self, data, start, end, include_end=True):
         assert start.tzinfo is not None, 'The start date should be timezone aware'
         assert end.tzinfo is not None, 'The end date should be timezone aware'
 
@@ -202,47 +263,216 @@ class SimpleExecutor:
         # bisect_right returns the index after the found element
         index_start = bisect_right(data.index, timestamp_start * 1000) - 1
         index_end = bisect_left(data.index, timestamp_end * 1000)
-        print(data.index, timestamp_end)
         if include_end is False and data.index[index_end] / 1000 == timestamp_end:
             index_end -= 1
         assert index_start >= 0, 'index_start too low {}'.format(index_start)
         assert index_end >= -1, 'index_end too low {}'.format(index_end)
         assert index_start < len(data.index), 'index_start too high {}'.format(index_start)
         assert index_end < len(data.index), 'index_end too high {}'.format(index_end)
+        return index_start, index_end
+
+    def filter_data(self, data, start, end, include_end=True):
+        index_start, index_end = self.interval_indexes(data, start, end, include_end)
         return data.iloc[index_start:index_end + 1]
 
-    def execute_strategy(self, strategy, data, start, end, plot=False):
+    def execute_strategy(self, strategy, data, start, end, plot=False, lookback=None, checkpoint_path=None, checkpoint_every=1000, resume=False, timeframe=None):
+        # lookback limits the historical data passed to the strategy to the
+        # latest rows, by default all the rows since start are passed.
+        # timeframe runs the strategy on bars rolled up from the data, e.g.
+        # '1d' on minute bars, see util.resample.
+        # With a checkpoint_path the state of the executor and the portfolio
+        # rows are saved every checkpoint_every rows, and with resume a run
+        # restarts after the rows of the checkpoint if there is one. The
+        # checkpoint is removed once the run completes. The strategy itself is
+        # not saved, a strategy keeping its own state should rebuild it from
+        # the historical data.
         assert start.tzinfo is not None, 'The start date should be timezone aware'
         assert end.tzinfo is not None, 'The end date should be timezone aware'
+        assert checkpoint_every > 0, 'checkpoint_every should be positive {}'.format(checkpoint_every)
 
         portfolio_data = []
 
-        # Timestamps in the interval
-        timestamps_ms = self.filter_data(data, start, end).index
+        data, bar_store = self.load_data(data, timeframe)
+        # Rows in the interval
+        index_start, index_end = self.interval_indexes(data, start, end)
+        index_resume = index_start
+        checkpoint_writer = CheckpointWriter(checkpoint_path) if checkpoint_path is not None else None
+        if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+            index_resume, portfolio_data, checkpoint_writer = self.restore_checkpoint(checkpoint_path, bar_store, index_start, index_end)
+
+        self.start_run(bar_store)
+        # The run is finished when the strategy raises too, the sinks are
+        # closed and the profiler stopped
+        try:
+            self.indicators.start(bar_store)
+            # The indicators are rebuilt from the rows before the checkpoint
+            for index in range(index_start, index_resume):
+                self.indicators.update(bar_store.row_at(index))
+
+            history = HistoryWindow(data, index_start, lookback)
+
+            for index in range(index_resume, index_end + 1):
+                with self.instrumentation.phase('data_lookup'):
+                    timestamp_ms = int(bar_store.timestamps[index])
+                    utc_t = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+                    # Historical data contains all the rows before the current one
+                    history.advance_to(index)
+                    historical_data = history.frame() if len(history) > 0 else None
+                    latest_interval = bar_store.row_at(index)
+
+                portfolio_data.append(self.run_tick(strategy, utc_t, historical_data, latest_interval))
+                self.indicators.update(latest_interval)
+
+                if checkpoint_writer is not None and (index + 1 - index_start) % checkpoint_every == 0 and index < index_end:
+                    self.write_checkpoint(checkpoint_writer, bar_store, index_start, index + 1, portfolio_data)
+        finally:
+            self.finish_run()
+        if checkpoint_path is not None:
+            remove_checkpoint(checkpoint_path)
+        from pandas import DataFrame
+        portfolio_data_frame = DataFrame(portfolio_data)
+
+        if plot:
+            self.plot(portfolio_data_frame)
+
+        return portfolio_data_frame
 
-        for timestamp_ms in timestamps_ms:
-            utc_t = datetime.fromtimestamp(timestamp_ms / 1000, utc)
-            filtered_historical_data = self.filter_data(data, start, utc_t, False)
+    def write_checkpoint(self, checkpoint_writer, bar_store, index_start, index_next, portfolio_data):
+        with self.instrumentation.phase('checkpoint'):
+            checkpoint_writer.write(self.state, portfolio_data, {
+                'index_start': index_start,
+                'index_next': index_next,
+                # Timestamp of the next row, to check that the data is the same
+                # when resuming
+                't': int(bar_store.timestamps[index_next]),
+            })
 
-            latest_interval = get_values_at_timestamp(data, timestamp_ms)
-            assert latest_interval is not None
-            current_data = {symbol:latest_interval['o'][symbol] for symbol in latest_interval['o']}
+    def restore_checkpoint(self, checkpoint_path, bar_store, index_start, index_end):
+        # Restores the state of the executor and returns the index of the
+        # next row, the portfolio rows before it and the writer of the next
+        # checkpoints
+        checkpoint = load_checkpoint(checkpoint_path)
+        index_next = checkpoint['index_next']
+        if checkpoint['index_start'] != index_start or index_next > index_end or int(bar_store.timestamps[index_next]) != checkpoint['t']:
+            raise Exception('Checkpoint {} does not match the run'.format(checkpoint_path))
+        self.state, portfolio_data, checkpoint_writer = restore_checkpoint(checkpoint_path, checkpoint)
+        return index_next, portfolio_data, checkpoint_writer
 
-            if len(filtered_historical_data) > 0:
-                strategy(utc_t, lambda *args, **kw: self.request_new_order(utc_t, *args, **kw), filtered_historical_data, current_data, self.state['positions'], self.state['cash'])
+    def start_run(self, bar_store):
+        self.instrumentation.start_run(symbols=len(bar_store.symbols), bars=len(bar_store))
+        self.state['positions'].align(bar_store.symbols)
+        self.order_book = OrderBook(bar_store.symbol_index)
+        for order in self.state['orders']:
+            if order['status'] == 'open':
+                self.order_book.add(order)
+
+    def run_tick(self, strategy, utc_t, historical_data, latest_interval):
+        # Calls the strategy, unless there is no historical data yet, and
+        # settles the tick
+        if historical_data is not None:
+            current_data = latest_interval['o']
+            with self.instrumentation.phase('strategy'):
+                strategy(utc_t, lambda *args, **kw: self.request_new_order(utc_t, *args, **kw), historical_data, current_data, self.state['positions'], self.state['cash'])
+        return self.settle_tick(utc_t, latest_interval)
 
-            self.check_orders_execution(utc_t, latest_interval)
+    def settle_tick(self, utc_t, latest_interval):
+        # Matches the open orders against the bar and returns the portfolio
+        # value
+        with self.instrumentation.phase('order_matching'):
+            self.match_open_orders(utc_t, latest_interval)
 
+        with self.instrumentation.phase('valuation'):
             today_portfolio_value = self.portfolio_value(latest_interval)
-            today_portfolio_value['t'] = utc_t
-            portfolio_data.append(today_portfolio_value)
+        today_portfolio_value['t'] = utc_t
+        self.instrumentation.tick(open_orders=len(self.order_book), **today_portfolio_value)
+        return today_portfolio_value
+
+    def finish_run(self):
+        self.order_book = None
+        self.run_summary = self.instrumentation.end_run()
+
+    def load_data(self, data, timeframe=None):
+        # Returns the frame passed to the strategies and the bar store read by
+        # the executor, built once so that every tick reads its row without
+        # copying. A path is memory mapped, only the rows the run touches are
+        # paged in. With a timeframe the bars are rolled up, the rollups of a
+        # path are cached next to it.
+        if isinstance(data, (str, os.PathLike)):
+            data = BarStore.load(data) if timeframe is None else get_rollup(data, timeframe)
+        elif timeframe is not None:
+            bar_store = data if isinstance(data, BarStore) else BarStore.from_dataframe(data)
+            data = resample_bar_store(bar_store, timeframe)
+        if isinstance(data, BarStore):
+            return data.to_frame(), data
+        return data, BarStore.from_dataframe(data)
+
+    def plot(self, portfolio_data_frame, max_points=PLOT_MAX_POINTS):
+        # Long runs are downsampled to max_points keeping the lowest and
+        # highest value of every bucket, drawdowns and peaks stay visible and
+        # rendering time doesn't grow with the run
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+        rows = downsample_min_max(portfolio_data_frame['low'].to_numpy(dtype=np.float64), max_points)
+        portfolio_data_frame.iloc[rows].plot(
+            kind='line', x='t', y='low', color='blue', ax=ax)
+        plt.show()
 
+    def execute_order_matrix(self, orders, data, start, end, plot=False):
+        # Vectorized alternative to execute_strategy for strategies that can
+        # be written as a matrix of market buy quantities, one row per
+        # timestamp in [start, end] and one column per symbol. Orders of a row
+        # are filled at the high of the same bar, like a market buy placed by
+        # a strategy on that tick, and the portfolio frame is computed for the
+        # whole run with array operations. Note that execute_strategy never
+        # calls the strategy on the first bar of the interval.
+        assert start.tzinfo is not None, 'The start date should be timezone aware'
+        assert end.tzinfo is not None, 'The end date should be timezone aware'
+        assert all(order['status'] != 'open' for order in self.state['orders']), 'Open orders are not supported'
+        from pandas import DataFrame
+
+        data, bar_store = self.load_data(data)
+        index_start, index_end = self.interval_indexes(data, start, end)
+        rows = slice(index_start, index_end + 1)
+        timestamps_ms = bar_store.timestamps[rows]
+
+        if isinstance(orders, DataFrame):
+            orders = orders.reindex(index=timestamps_ms, columns=bar_store.symbols, fill_value=0).to_numpy(dtype=np.float64)
+        orders = np.nan_to_num(np.asarray(orders, dtype=np.float64))
+        assert orders.shape == (len(timestamps_ms), len(bar_store.symbols)), 'Orders have shape {}'.format(orders.shape)
+        if (orders < 0).any():
+            raise NotImplementedError()
+
+        initial_qty = np.zeros(len(bar_store.symbols))
+        for symbol, position in self.state['positions'].items():
+            initial_qty[bar_store.symbol_index[symbol]] = position['qty']
+
+        # Market buys fill at the high of the bar. Products are only summed
+        # where an order exists, like execute_order does, so that a missing
+        # bar only affects the cash when an order was placed on it.
+        high = bar_store.h[rows]
+        cost = np.where(orders != 0, high * orders, 0).sum(axis=1)
+        cash = self.state['cash'] - np.cumsum(cost)
+        if (cash < 0).any():
+            raise Exception('Cash is below zero')
+        qty = initial_qty + np.cumsum(orders, axis=0)
+
+        portfolio_data = {}
+        for column, field in (('high', 'h'), ('low', 'l'), ('open', 'o'), ('close', 'c')):
+            prices = bar_store.field(field)[rows]
+            # Same as force_finite on every price
+            prices = np.where(np.isnan(prices), 0, prices)
+            portfolio_data[column] = np.einsum('ij,ij->i', prices, qty) + cash
+        portfolio_data['cash'] = cash
+        portfolio_data['t'] = [datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc) for timestamp_ms in timestamps_ms]
         portfolio_data_frame = DataFrame(portfolio_data)
 
+        self.state['cash'] = float(cash[-1]) if len(cash) > 0 else self.state['cash']
+        symbol_cost = np.where(orders != 0, high * orders, 0).sum(axis=0)
+        for column in np.flatnonzero(orders.sum(axis=0)):
+            qty_bought = orders[:, column].sum()
+            self.update_position(bar_store.symbols[column], qty_bought, symbol_cost[column] / qty_bought)
+
         if plot:
-            ax = plt.gca()
-            portfolio_data_frame.plot(
-                kind='line', x='t', y='low', color='blue', ax=ax)
-            plt.show()
+            self.plot(portfolio_data_frame)
 
         return portfolio_data_frame
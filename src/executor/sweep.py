@@ -0,0 +1,75 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from executor.analytics import analyze
+from executor.simple_executor import SimpleExecutor
+from util.bar_store import BarStore
+
+
+def parameter_grid(grid):
+    # {'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]
+    names = list(grid)
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+
+def summarize_portfolio(portfolio, cash):
+    close = portfolio['close']
+    metrics = analyze(portfolio)
+    return {
+        'final_value': close.iloc[-1],
+        'total_return': close.iloc[-1] / cash - 1,
+        'max_drawdown': metrics['max_drawdown'],
+        'min_cash': portfolio['cash'].min(),
+        'cagr': metrics['cagr'],
+        'sharpe': metrics['sharpe'],
+        'sortino': metrics['sortino'],
+        'max_drawdown_duration': metrics['max_drawdown_duration'],
+        'turnover': metrics['turnover'],
+        'exposure': metrics['exposure'],
+    }
+
+
+def _run_strategy(strategy_factory, params, bar_store_path, start, end, cash, lookback):
+    # Runs in the worker process, the market data is memory mapped so every
+    # worker reads the same pages instead of receiving a pickled copy
+    bar_store = BarStore.load(bar_store_path)
+    executor = SimpleExecutor()
+    executor.set_cash(cash)
+    return executor.execute_strategy(strategy_factory(**params), bar_store, start, end, lookback=lookback)
+
+
+def sweep(strategy_factory, grid, data, start, end, cash, max_workers=None, lookback=None):
+    # strategy_factory(**params) should return the strategy to run for every
+    # parameter set in the grid. Both the factory and the parameters must be
+    # picklable, e.g. a module level function.
+    # Returns the portfolio curves of all the runs in long format and one row
+    # of summary metrics per parameter set, both tagged with the parameters.
+    params_list = parameter_grid(grid)
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        # Workers map the directory of a path or of a loaded store, only a
+        # store in memory is written to a temporary one
+        if isinstance(data, (str, os.PathLike)):
+            bar_store_path = data
+        elif isinstance(data, BarStore) and data.path is not None:
+            bar_store_path = data.path
+        else:
+            bar_store_path = temp_path
+            bar_store = data if isinstance(data, BarStore) else BarStore.from_dataframe(data)
+            bar_store.save(bar_store_path)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(_run_strategy, strategy_factory, params, bar_store_path, start, end, cash, lookback)
+                for params in params_list
+            ]
+            portfolios = [future.result() for future in futures]
+
+    from pandas import DataFrame, concat
+    curves = []
+    summary = []
+    for run, (params, portfolio) in enumerate(zip(params_list, portfolios)):
+        curves.append(portfolio.assign(run=run, **params))
+        summary.append(dict(run=run, **params, **summarize_portfolio(portfolio, cash)))
+
+    return concat(curves, ignore_index=True), DataFrame(summary)
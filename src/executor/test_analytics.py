@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from pytz import utc
+from executor.analytics import analyze, downsample_min_max, get_periods_per_year
+
+
+def get_portfolio(close, cash, spacing=timedelta(days=1)):
+    start = datetime(2020, 1, 1, tzinfo=utc)
+    close = np.asarray(close, dtype=np.float64)
+    return pd.DataFrame({
+        'high': close,
+        'low': close,
+        'open': close,
+        'close': close,
+        'cash': np.asarray(cash, dtype=np.float64),
+        't': [start + i * spacing for i in range(len(close))],
+    })
+
+
+def test_analyze():
+    portfolio = get_portfolio([100, 110, 99, 88, 99, 121, 110], [100, 50, 50, 50, 50, 60, 60])
+    metrics = analyze(portfolio, periods_per_year=252)
+
+    returns = portfolio['close'].pct_change().dropna()
+    assert np.isclose(metrics['total_return'], 0.1)
+    assert np.isclose(metrics['sharpe'], returns.mean() / returns.std() * np.sqrt(252))
+    assert np.isclose(metrics['sortino'], returns.mean() / np.sqrt((returns.clip(upper=0) ** 2).mean()) * np.sqrt(252))
+    assert np.isclose(metrics['max_drawdown'], 88 / 110 - 1)
+    assert metrics['max_drawdown_at'] == portfolio['t'].iloc[3]
+    # Three bars under the peak of 110 of the second bar
+    assert metrics['max_drawdown_bars'] == 3
+    assert metrics['max_drawdown_duration'] == timedelta(days=3)
+    assert np.isclose(metrics['turnover'], 60 / portfolio['close'].mean())
+    assert np.isclose(metrics['exposure'], ((portfolio['close'] - portfolio['cash']) / portfolio['close']).mean())
+    assert np.isclose(metrics['time_in_market'], 6 / 7)
+
+
+def test_periods_per_year():
+    day = 24 * 60 * 60
+    assert get_periods_per_year(np.arange(10) * day) == 252
+    assert get_periods_per_year(np.arange(10) * 60) == 252 * 390
+    metrics = analyze(get_portfolio([100, 101, 102], [0, 0, 0], spacing=timedelta(minutes=1)))
+    assert metrics['periods_per_year'] == 252 * 390
+
+
+def test_downsample_min_max():
+    y = np.sin(np.linspace(0, 50, 100000)) + np.linspace(0, 1, 100000)
+    y[12345] = -10
+    y[54321] = 10
+    rows = downsample_min_max(y, 1000)
+
+    assert len(rows) <= 1000
+    assert (np.diff(rows) > 0).all()
+    assert 12345 in rows
+    assert 54321 in rows
+    assert (downsample_min_max(y[:500], 1000) == np.arange(500)).all()
+
@@ -0,0 +1,92 @@
+import pickle
+from datetime import datetime
+import pytest
+from pytz import utc
+from executor.checkpoint import CheckpointWriter, get_journal_path, load_checkpoint, restore_checkpoint
+from executor.simple_executor import SimpleExecutor
+from executor.test_indicators import get_bar_store
+
+
+class Crash(Exception):
+    pass
+
+
+def get_strategy(crash_at=None):
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        if now == crash_at:
+            raise Crash()
+        if current_data['SYMBOL1'] < historical_data['c']['SYMBOL1'].iloc[-1]:
+            request_new_order('SYMBOL1', 1, 'buy', 'limit', 'gtc', current_data['SYMBOL1'] - 0.5, None, False, 'order')
+    return strategy
+
+
+def test_resume_same_as_uninterrupted_run(tmp_path):
+    bar_store = get_bar_store(rows=60)
+    start = datetime.fromtimestamp(0, utc)
+    end = datetime.fromtimestamp(59, utc)
+    checkpoint_path = str(tmp_path / 'run.checkpoint')
+
+    executor = SimpleExecutor()
+    executor.set_cash(100000)
+    expected = executor.execute_strategy(get_strategy(), bar_store, start, end)
+
+    crashed_executor = SimpleExecutor()
+    crashed_executor.set_cash(100000)
+    with pytest.raises(Crash):
+        crashed_executor.execute_strategy(get_strategy(crash_at=datetime.fromtimestamp(45, utc)), bar_store, start, end, checkpoint_path=checkpoint_path, checkpoint_every=10)
+
+    resumed_executor = SimpleExecutor()
+    portfolio = resumed_executor.execute_strategy(get_strategy(), bar_store, start, end, checkpoint_path=checkpoint_path, checkpoint_every=10, resume=True)
+
+    assert portfolio.equals(expected)
+    assert resumed_executor.state['cash'] == executor.state['cash']
+    assert list(resumed_executor.state['orders']) == list(executor.state['orders'])
+    assert resumed_executor.state['positions']['SYMBOL1']['qty'] == executor.state['positions']['SYMBOL1']['qty']
+    # Removed once the run completes
+    assert not (tmp_path / 'run.checkpoint').exists()
+
+
+def test_resume_checks_the_data(tmp_path):
+    bar_store = get_bar_store(rows=60)
+    start = datetime.fromtimestamp(0, utc)
+    end = datetime.fromtimestamp(59, utc)
+    checkpoint_path = str(tmp_path / 'run.checkpoint')
+
+    executor = SimpleExecutor()
+    executor.set_cash(100000)
+    with pytest.raises(Crash):
+        executor.execute_strategy(get_strategy(crash_at=datetime.fromtimestamp(30, utc)), bar_store, start, end, checkpoint_path=checkpoint_path, checkpoint_every=10)
+
+    with pytest.raises(Exception, match='does not match'):
+        SimpleExecutor().execute_strategy(get_strategy(), bar_store, datetime.fromtimestamp(5, utc), end, checkpoint_path=checkpoint_path, resume=True)
+
+
+def test_checkpoint_writer_appends_new_rows(tmp_path):
+    checkpoint_path = str(tmp_path / 'run.checkpoint')
+    executor = SimpleExecutor()
+    executor.set_cash(1000)
+    times = [datetime.fromtimestamp(t, utc) for t in range(3)]
+    rows = [{'close': 1000.0 + i, 'cash': 1000.0, 't': t} for i, t in enumerate(times)]
+    orders = executor.state['orders']
+
+    writer = CheckpointWriter(checkpoint_path)
+    executor.request_new_order(times[0], 'SYMBOL1', 1, 'buy', 'market', 'day', None, None, False, 'a')
+    executor.request_new_order(times[0], 'SYMBOL2', 1, 'buy', 'limit', 'gtc', 1, None, False, 'b')
+    orders[0]['status'] = 'filled'
+    writer.write(executor.state, rows[:2], {})
+    executor.request_new_order(times[2], 'SYMBOL1', 1, 'buy', 'market', 'day', None, None, False, 'c')
+    orders[2]['status'] = 'expired'
+    writer.write(executor.state, rows, {})
+
+    # Every order and row is written once, the open order is in the checkpoint
+    with open(get_journal_path(checkpoint_path), 'rb') as f:
+        chunks = [pickle.load(f), pickle.load(f)]
+    assert [chunk['orders']['indexes'].tolist() for chunk in chunks] == [[0], [2]]
+    assert [len(chunk['portfolio']['t']) for chunk in chunks] == [2, 1]
+    checkpoint = load_checkpoint(checkpoint_path)
+    assert checkpoint['open_orders']['indexes'].tolist() == [1]
+
+    state, portfolio_rows, _ = restore_checkpoint(checkpoint_path, checkpoint)
+    assert list(state['orders']) == list(orders)
+    assert portfolio_rows == rows
+    assert state['cash'] == 1000
@@ -0,0 +1,79 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from pandas import DataFrame
+from pytz import utc
+from executor.indicators import IndicatorEngine
+from executor.simple_executor import SimpleExecutor
+from executor.test_simple_executor import get_data
+from util.bar_store import BarStore
+
+
+def get_bar_store(rows=60, seed=0):
+    rng = np.random.default_rng(seed)
+    c = 100 + rng.standard_normal((rows, 3)).cumsum(axis=0)
+    # Missing bars for the last symbol
+    c[10:13, 2] = np.nan
+    return BarStore(np.arange(rows) * 1000, ['SYMBOL1', 'SYMBOL2', 'SYMBOL3'], o=c, h=c + 1, l=c - 1, c=c)
+
+
+def run_engine(engine, bar_store):
+    values = {key: [] for key in engine.indicators}
+    engine.start(bar_store)
+    for index in range(len(bar_store)):
+        engine.update(bar_store.row_at(index))
+        for key, indicator in engine.indicators.items():
+            values[key].append(indicator.value.copy())
+    return {key: np.array(rows) for key, rows in values.items()}
+
+
+@pytest.mark.parametrize('window', [1, 4, 7])
+def test_indicators_same_as_pandas(window):
+    bar_store = get_bar_store()
+    engine = IndicatorEngine()
+    engine.sma(window)
+    engine.zscore(window)
+    engine.rolling_min(window)
+    engine.rolling_max(window)
+    engine.returns(window)
+    values = run_engine(engine, bar_store)
+
+    c = DataFrame(bar_store.c)
+    rolling = c.rolling(window)
+    np.testing.assert_allclose(values[('sma', 'c', window)], rolling.mean(), equal_nan=True)
+    np.testing.assert_allclose(values[('min', 'l', window)], DataFrame(bar_store.l).rolling(window).min(), equal_nan=True)
+    np.testing.assert_allclose(values[('max', 'h', window)], DataFrame(bar_store.h).rolling(window).max(), equal_nan=True)
+    np.testing.assert_allclose(values[('returns', 'c', window)], c / c.shift(window) - 1, equal_nan=True)
+    if window > 1:
+        np.testing.assert_allclose(values[('zscore', 'c', window)], (c - rolling.mean()) / rolling.std(), equal_nan=True, rtol=1e-6)
+
+
+def test_ema_same_as_pandas():
+    bar_store = get_bar_store()
+    engine = IndicatorEngine()
+    engine.ema(5)
+    values = run_engine(engine, bar_store)
+    expected = DataFrame(bar_store.c[:, :2]).ewm(span=5, adjust=False).mean()
+    np.testing.assert_allclose(values[('ema', 'c', 5)][:, :2], expected)
+
+
+def test_register_shares_indicators():
+    engine = IndicatorEngine()
+    assert engine.sma(5) is engine.sma(5)
+    assert engine.sma(5) is not engine.sma(5, field='o')
+
+
+def test_execute_strategy_updates_indicators():
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    executor = SimpleExecutor()
+    last_close = executor.indicators.sma(1)
+    seen = []
+
+    def mock_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        # Same information as the historical data
+        seen.append(last_close['SYMBOL1'])
+        assert last_close['SYMBOL1'] == historical_data['c']['SYMBOL1'].tolist()[-1]
+
+    executor.execute_strategy(mock_strategy, get_data(), start, end)
+    assert seen == [11, 11]
@@ -0,0 +1,89 @@
+import json
+import logging
+import sys
+from datetime import datetime
+import pytest
+from pytz import utc
+from executor.simple_executor import SimpleExecutor
+from executor.instrumentation import Instrumentation, MemorySink, JsonLinesSink, CProfileSink, PHASES
+from executor.test_simple_executor import get_data
+
+
+def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+    request_new_order('SYMBOL1', 1, 'buy', 'market', 'day', None, None, False, 'id123')
+
+
+def run(instrumentation):
+    executor = SimpleExecutor(instrumentation=instrumentation)
+    executor.set_cash(1000)
+    portfolio = executor.execute_strategy(strategy, get_data(), datetime(2019, 1, 1, tzinfo=utc), datetime(2019, 1, 3, tzinfo=utc))
+    return executor, portfolio
+
+
+def test_instrumentation_summary():
+    sink = MemorySink()
+    executor, portfolio = run(Instrumentation([sink], tick_records=True))
+
+    summary = executor.run_summary
+    assert sink.records[-1] is summary
+    assert set(summary['phases']) == set(PHASES)
+    assert summary['counters']['ticks'] == len(portfolio)
+    assert summary['counters']['orders_requested'] == 2
+    assert summary['counters']['orders_filled'] == 2
+    assert summary['info'] == {'symbols': 2, 'bars': 3}
+
+    ticks = [record for record in sink.records if record['type'] == 'tick']
+    assert [tick['t'] for tick in ticks] == list(portfolio['t'])
+    assert [tick['cash'] for tick in ticks] == list(portfolio['cash'])
+    assert 'strategy' in executor.instrumentation.report()
+
+
+def test_instrumentation_disabled():
+    executor, portfolio = run(None)
+    assert executor.run_summary is None
+    assert portfolio.equals(run(Instrumentation())[1])
+
+
+def test_json_lines_sink(tmp_path):
+    path = tmp_path / 'runs.jsonl'
+    instrumentation = Instrumentation([JsonLinesSink(str(path))])
+    run(instrumentation)
+    run(instrumentation)
+
+    with open(str(path)) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 2
+    assert records[0]['counters']['orders_filled'] == 2
+
+
+def test_cprofile_sink(tmp_path):
+    path = tmp_path / 'run.prof'
+    executor, portfolio = run(Instrumentation([CProfileSink(str(path))]))
+    assert 'run_tick' in executor.run_summary['profile']
+    assert path.exists()
+
+
+def test_sinks_closed_when_strategy_raises(tmp_path):
+    path = tmp_path / 'runs.jsonl'
+    json_lines_sink = JsonLinesSink(str(path))
+    executor = SimpleExecutor(instrumentation=Instrumentation([json_lines_sink, CProfileSink()]))
+
+    def failing_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        executor.execute_strategy(failing_strategy, get_data(), datetime(2019, 1, 1, tzinfo=utc), datetime(2019, 1, 3, tzinfo=utc))
+    assert sys.getprofile() is None
+    assert json_lines_sink.file is None
+    # The profile is in the summary written by the sink before it
+    with open(str(path)) as f:
+        assert 'function calls' in json.loads(f.read())['profile']
+
+
+def test_logging(caplog):
+    with caplog.at_level(logging.DEBUG, logger='executor.simple_executor'):
+        run(None)
+    events = [record.event for record in caplog.records]
+    assert events.count('order') == 2
+    assert events.count('fill') == 2
+    assert events.count('cash') == 2
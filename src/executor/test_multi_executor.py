@@ -0,0 +1,36 @@
+from datetime import datetime
+from pytz import utc
+from executor.simple_executor import SimpleExecutor
+from executor.multi_executor import MultiStrategyExecutor
+from executor.test_simple_executor import get_data
+
+
+def get_buy_strategy(symbol, qty):
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        request_new_order(symbol, qty, 'buy', 'market', 'day', None, None, False, 'id123')
+    return strategy
+
+
+def test_execute_strategies_same_as_execute_strategy():
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+    strategies = {
+        'buy_symbol1': get_buy_strategy('SYMBOL1', 1),
+        'buy_symbol2': get_buy_strategy('SYMBOL2', 3),
+    }
+
+    multi_executor = MultiStrategyExecutor(strategies)
+    multi_executor.set_cash(1000)
+    portfolios = multi_executor.execute_strategies(data, start, end)
+
+    for name, strategy in strategies.items():
+        executor = SimpleExecutor()
+        executor.set_cash(1000)
+        expected = executor.execute_strategy(strategy, data, start, end)
+        assert portfolios[name].equals(expected)
+        assert multi_executor.executors[name].state['cash'] == executor.state['cash']
+
+    # States are isolated
+    assert 'SYMBOL2' not in multi_executor.executors['buy_symbol1'].state['positions']
+    assert len(multi_executor.executors['buy_symbol2'].state['orders']) == 2
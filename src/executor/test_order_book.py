@@ -0,0 +1,79 @@
+import random
+from copy import deepcopy
+from datetime import datetime, timedelta
+from pytz import utc
+import numpy as np
+from executor.simple_executor import SimpleExecutor
+from executor.order_book import OrderBook
+from executor.test_simple_executor import get_order
+
+
+def get_random_orders(count, symbols, start):
+    rng = random.Random(0)
+    orders = []
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        # Market orders on a missing bar fill at NaN, keep them out of the comparison
+        types = ('limit', 'stop', 'stop_limit') if symbol == symbols[-1] else ('market', 'limit', 'stop', 'stop_limit')
+        orders.append(get_order(
+            start + timedelta(hours=rng.randint(0, 48)),
+            symbol=symbol,
+            qty=rng.randint(1, 5),
+            type=rng.choice(types),
+            side=rng.choice(('buy', 'sell')),
+            time_in_force=rng.choice(('day', 'gtc')),
+            limit_price=rng.uniform(4, 16),
+            stop_price=rng.uniform(4, 16),
+        ))
+    return orders
+
+
+def test_match_same_as_check_order_execution():
+    symbols = ['SYMBOL1', 'SYMBOL2', 'SYMBOL3']
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    orders = get_random_orders(500, symbols, start)
+    bars = [
+        {'h': {'SYMBOL1': 15.0, 'SYMBOL2': 9.0, 'SYMBOL3': np.nan}, 'l': {'SYMBOL1': 5.0, 'SYMBOL2': 8.0, 'SYMBOL3': np.nan}},
+        {'h': {'SYMBOL1': 12.0, 'SYMBOL2': 14.0, 'SYMBOL3': 10.0}, 'l': {'SYMBOL1': 11.0, 'SYMBOL2': 6.0, 'SYMBOL3': 7.0}},
+        {'h': {'SYMBOL1': 6.0, 'SYMBOL2': 16.0, 'SYMBOL3': 12.0}, 'l': {'SYMBOL1': 4.0, 'SYMBOL2': 4.5, 'SYMBOL3': 11.0}},
+    ]
+    times = [start + timedelta(days=day, hours=12) for day in range(len(bars))]
+
+    scalar_executor = SimpleExecutor()
+    scalar_executor.set_cash(1000000)
+    scalar_executor.state['orders'] = deepcopy(orders)
+
+    book_executor = SimpleExecutor()
+    book_executor.set_cash(1000000)
+    book_executor.state['orders'] = deepcopy(orders)
+    symbol_index = {symbol: index for index, symbol in enumerate(symbols)}
+    book_executor.order_book = OrderBook(symbol_index, capacity=8)
+    for order in book_executor.state['orders']:
+        book_executor.order_book.add(order)
+
+    for time, bar in zip(times, bars):
+        scalar_executor.check_orders_execution(time, bar)
+        high = np.array([bar['h'][symbol] for symbol in symbols])
+        low = np.array([bar['l'][symbol] for symbol in symbols])
+        for order, price in book_executor.order_book.match(time, high, low):
+            if price is None:
+                book_executor.expire_order(time, order)
+            else:
+                book_executor.execute_order(time, order, price)
+
+    assert book_executor.state['orders'] == scalar_executor.state['orders']
+    assert book_executor.state['cash'] == scalar_executor.state['cash']
+    statuses = {order['status'] for order in scalar_executor.state['orders']}
+    assert statuses == {'open', 'filled', 'expired'}
+    assert len(book_executor.order_book) == sum(order['status'] == 'open' for order in scalar_executor.state['orders'])
+
+
+def test_match_keeps_unfilled_orders_open():
+    book = OrderBook({'SYMBOL1': 0})
+    time = datetime(2019, 1, 1, tzinfo=utc)
+    order = get_order(time, type='limit', side='buy', limit_price=4.0)
+    book.add(order)
+    assert book.match(time, np.array([15.0]), np.array([5.0])) == []
+    assert len(book) == 1
+    assert book.match(time, np.array([15.0]), np.array([3.0])) == [(order, 4.0)]
+    assert len(book) == 0
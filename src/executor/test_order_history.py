@@ -0,0 +1,58 @@
+import pickle
+from datetime import datetime
+from pytz import utc
+from executor.order_history import OrderHistory
+
+
+def get_order_dict(time, symbol='SYMBOL1', qty=10, limit_price=None):
+    return {
+        'symbol': symbol,
+        'qty': qty,
+        'side': 'buy',
+        'type': 'market' if limit_price is None else 'limit',
+        'time_in_force': 'day',
+        'limit_price': limit_price,
+        'stop_price': None,
+        'extended_hours': False,
+        'client_order_id': 'id123',
+        'status': 'open',
+        'created_at': time,
+        'submitted_at': time,
+        'filled_qty': 0,
+    }
+
+
+def test_order_history_behaves_like_list_of_dicts():
+    time = datetime(2019, 1, 1, tzinfo=utc)
+    history = OrderHistory(capacity=2)
+    orders = [get_order_dict(time, symbol='SYMBOL{}'.format(index % 3), qty=index, limit_price=index or None) for index in range(5)]
+    for order in orders:
+        history.append(order)
+
+    assert len(history) == 5
+    assert list(history) == orders
+    assert orders[3] in history
+    assert history[-1] == orders[-1]
+    assert history[1:3] == orders[1:3]
+
+    history[1]['status'] = 'filled'
+    history[1]['filled_avg_price'] = 12.5
+    history[1]['filled_at'] = time
+    orders[1].update(status='filled', filled_avg_price=12.5, filled_at=time)
+    assert list(history) == orders
+    assert history[1]['filled_at'] is time
+    assert 'filled_at' not in history[0]
+    assert type(history[2]['qty']) is int
+    assert type(history[2]['filled_qty']) is int
+    history[2]['qty'] = 0.5
+    assert history[2]['qty'] == 0.5
+
+
+def test_order_history_pickle():
+    time = datetime(2019, 1, 1, tzinfo=utc)
+    history = OrderHistory()
+    history.append(get_order_dict(time))
+    loaded = pickle.loads(pickle.dumps(history))
+    assert list(loaded) == list(history)
+    loaded.append(get_order_dict(time, symbol='SYMBOL2'))
+    assert loaded[1]['symbol'] == 'SYMBOL2'
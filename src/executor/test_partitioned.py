@@ -0,0 +1,86 @@
+from datetime import datetime
+import numpy as np
+from pytz import utc
+from executor.indicators import IndicatorEngine
+from executor.partitioned import execute_strategy_partitioned, split_rows
+from executor.simple_executor import SimpleExecutor
+from executor.test_indicators import get_bar_store
+from util.bar_store import BarStore
+
+
+class BreakoutStrategy:
+    # Buys a symbol opening above the highest close of the lookback rows
+    # while its short moving average is above the close
+    lookback = 5
+
+    def __init__(self):
+        self.indicators = IndicatorEngine()
+        self.sma = self.indicators.sma(3)
+
+    def __call__(self, now, request_new_order, historical_data, current_data, positions, cash):
+        for symbol in ('SYMBOL1', 'SYMBOL2', 'SYMBOL3'):
+            highest = historical_data['c'][symbol].max()
+            if current_data[symbol] > highest or self.sma[symbol] > historical_data['c'][symbol].iloc[-1]:
+                request_new_order(symbol, 1, 'buy', 'limit', 'gtc', current_data[symbol] - 0.5, None, False, symbol)
+
+
+def buy_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+    request_new_order('SYMBOL1', 1, 'buy', 'market', 'day', None, None, False, 'order')
+
+
+def test_split_rows():
+    assert split_rows(2, 11, 3) == [(2, 4), (5, 7), (8, 11)]
+    assert split_rows(0, 1, 4) == [(0, 0), (1, 1)]
+
+
+def test_partitioned_same_as_serial():
+    bar_store = get_bar_store(rows=60)
+    start = datetime.fromtimestamp(3, utc)
+    end = datetime.fromtimestamp(57, utc)
+
+    strategy = BreakoutStrategy()
+    serial_executor = SimpleExecutor(strategy.indicators)
+    serial_executor.set_cash(100000)
+    expected = serial_executor.execute_strategy(strategy, bar_store, start, end, lookback=strategy.lookback)
+
+    executor = SimpleExecutor()
+    executor.set_cash(100000)
+    portfolio = execute_strategy_partitioned(executor, BreakoutStrategy(), bar_store, start, end, chunks=4, max_workers=2)
+
+    assert portfolio.equals(expected)
+    assert executor.state['cash'] == serial_executor.state['cash']
+    assert list(executor.state['orders']) == list(serial_executor.state['orders'])
+    assert np.array_equal(executor.state['positions'].vector(3), serial_executor.state['positions'].vector(3))
+    # Limit orders left open by a chunk are filled in the following ones
+    assert {order['status'] for order in executor.state['orders']} == {'open', 'filled'}
+
+
+def test_partitioned_runs_other_strategies_serially():
+    bar_store = get_bar_store(rows=10)
+    start = datetime.fromtimestamp(0, utc)
+    end = datetime.fromtimestamp(9, utc)
+
+    serial_executor = SimpleExecutor()
+    serial_executor.set_cash(100000)
+    expected = serial_executor.execute_strategy(buy_strategy, bar_store, start, end)
+
+    executor = SimpleExecutor()
+    executor.set_cash(100000)
+    assert execute_strategy_partitioned(executor, buy_strategy, bar_store, start, end, chunks=2).equals(expected)
+
+
+def test_partitioned_loaded_store(tmp_path, monkeypatch):
+    get_bar_store(rows=30).save(str(tmp_path))
+    bar_store = BarStore.load(str(tmp_path))
+    start = datetime.fromtimestamp(3, utc)
+    end = datetime.fromtimestamp(27, utc)
+    strategy = BreakoutStrategy()
+    serial_executor = SimpleExecutor(strategy.indicators)
+    serial_executor.set_cash(100000)
+    expected = serial_executor.execute_strategy(strategy, bar_store, start, end, lookback=strategy.lookback)
+
+    # The workers map the store in place, it is never written again
+    monkeypatch.setattr(BarStore, 'save', None)
+    executor = SimpleExecutor()
+    executor.set_cash(100000)
+    assert execute_strategy_partitioned(executor, BreakoutStrategy(), bar_store, start, end, chunks=2, max_workers=2).equals(expected)
@@ -0,0 +1,61 @@
+import pickle
+import numpy as np
+from executor.position_book import PositionBook
+
+
+def test_position_book():
+    positions = PositionBook(capacity=1)
+    assert 'SYMBOL1' not in positions
+    assert positions['SYMBOL1']['qty'] == 0
+
+    positions.add('SYMBOL1', 10)
+    positions.add('SYMBOL2', -5)
+    positions.add('SYMBOL1', 2)
+    assert list(positions) == ['SYMBOL1', 'SYMBOL2']
+    assert positions['SYMBOL1']['qty'] == 12
+    # Whole quantities are ints, like the quantities ordered
+    assert type(positions['SYMBOL1']['qty']) is int
+    assert positions['SYMBOL1']['side'] == 'long'
+    assert positions['SYMBOL2']['qty'] == 5
+    assert positions['SYMBOL2']['side'] == 'short'
+    assert positions['SYMBOL2']['market_value'] is None
+
+    # Aligned like the bar store columns, held symbols missing from them are
+    # kept at the end
+    positions.align(['SYMBOL3', 'SYMBOL2'])
+    assert np.array_equal(positions.vector(2), [0, -5])
+    assert positions.symbols == ['SYMBOL3', 'SYMBOL2', 'SYMBOL1']
+    assert list(positions) == ['SYMBOL2', 'SYMBOL1']
+    assert 'SYMBOL3' not in positions
+    assert positions['SYMBOL1']['qty'] == 12
+
+    loaded = pickle.loads(pickle.dumps(positions))
+    assert dict(loaded['SYMBOL2']) == dict(positions['SYMBOL2'])
+
+
+def test_position_fields():
+    positions = PositionBook()
+    positions.add('SYMBOL1', 10, 5.0)
+    positions.add('SYMBOL1', 10, 7.0)
+    assert positions['SYMBOL1']['current_price'] is None
+    positions.align(['SYMBOL1', 'SYMBOL2'])
+    positions.mark(np.array([8.0, 3.0]))
+    # A missing price keeps the previous one
+    positions.mark(np.array([np.nan, 3.0]))
+
+    position = positions['SYMBOL1']
+    assert position['cost_basis'] == 120
+    assert position['avg_entry_price'] == 6
+    assert position['current_price'] == 8
+    assert position['market_value'] == 160
+    assert position['unrealized_pl'] == 40
+    assert position['unrealized_plpc'] == 40 / 120
+    assert positions['SYMBOL2']['market_value'] is None
+
+    # Selling keeps the average entry price, flipping side restarts it
+    positions.add('SYMBOL1', -5, 9.0)
+    assert positions['SYMBOL1']['avg_entry_price'] == 6
+    positions.add('SYMBOL1', -25, 9.0)
+    assert positions['SYMBOL1']['side'] == 'short'
+    assert positions['SYMBOL1']['avg_entry_price'] == 9
+    assert positions['SYMBOL1']['market_value'] == -80
@@ -1,10 +1,13 @@
 import pytest
+import numpy as np
 from executor.simple_executor import SimpleExecutor
 from datetime import datetime
 from pandas import DataFrame, concat, pivot, MultiIndex
 from pytz import timezone, utc
 import calendar
 from util.dataframe_util import get_values_at_timestamp
+from util.bar_store import BarStore
+from benchmark.synthetic import generate_market_data
 
 
 def get_data():
@@ -143,6 +146,34 @@ def test_request_new_order():
     } in executor.state['orders']
 
 
+def test_request_new_order_missing_price():
+    executor = SimpleExecutor()
+    time = datetime(2019, 1, 1)
+    with pytest.raises(AssertionError, match='limit_price'):
+        executor.request_new_order(time, 'SYMBOL', 12, 'buy', 'limit', 'day', None, None, True, 'id123')
+    with pytest.raises(AssertionError, match='stop_price'):
+        executor.request_new_order(time, 'SYMBOL', 12, 'buy', 'stop', 'day', None, None, True, 'id123')
+    with pytest.raises(AssertionError, match='stop_price'):
+        executor.request_new_order(time, 'SYMBOL', 12, 'buy', 'stop_limit', 'day', 10, None, True, 'id123')
+    assert len(executor.state['orders']) == 0
+
+
+def test_portfolio_value_mapping():
+    data = get_data()
+    bar_store = BarStore.from_dataframe(data)
+    timestamp_ms = int(bar_store.timestamps[1])
+    values = []
+    for last_interval in (bar_store.row(timestamp_ms), get_values_at_timestamp(data, timestamp_ms)):
+        executor = SimpleExecutor()
+        executor.set_cash(100)
+        executor.update_position('SYMBOL1', 3, 9.0)
+        executor.update_position('SYMBOL2', -2, 9.0)
+        values.append(executor.portfolio_value(last_interval))
+        values.append(executor.state['positions']['SYMBOL1']['market_value'])
+    assert values[0] == values[2]
+    assert values[1] == values[3]
+
+
 def test_execute_strategy_request_new_order():
     executor = SimpleExecutor()
     start = datetime(2019, 1, 1, tzinfo=utc)
@@ -307,3 +338,99 @@ def test_filter_data():
 
     assert len(executor.filter_data(data, start, end)) == 2
     assert len(executor.filter_data(data, start, end, include_end=False)) == 1
+
+
+def test_execute_strategy_historical_data():
+    executor = SimpleExecutor()
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+    lengths = []
+
+    def mock_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        assert historical_data['c']['SYMBOL1'].tolist()[-1] == 11
+        assert datetime.fromtimestamp(historical_data.index[-1] / 1000, utc) < now
+        lengths.append(len(historical_data))
+
+    executor.execute_strategy(mock_strategy, data, start, end)
+    assert lengths == [1, 2]
+
+    lengths.clear()
+    executor.execute_strategy(mock_strategy, data, start, end, lookback=1)
+    assert lengths == [1, 1]
+
+
+def test_execute_strategy_memory_mapped(tmp_path):
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+    BarStore.from_dataframe(data).save(str(tmp_path))
+
+    def mock_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        assert historical_data['c']['SYMBOL1'].tolist()[-1] == 11
+        request_new_order('SYMBOL1', 1, 'buy', 'market', 'day', None, None, False, 'id123')
+
+    executor = SimpleExecutor()
+    executor.set_cash(1000)
+    expected = executor.execute_strategy(mock_strategy, data, start, end)
+    executor.reset()
+    executor.set_cash(1000)
+    portfolio = executor.execute_strategy(mock_strategy, str(tmp_path), start, end)
+    assert portfolio.equals(expected)
+
+
+def test_execute_order_matrix_same_as_execute_strategy():
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+    quantities = {'SYMBOL1': 2, 'SYMBOL2': 3}
+
+    def mock_strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        for symbol, qty in quantities.items():
+            request_new_order(symbol, qty, 'buy', 'market', 'day', None, None, False, 'id123')
+
+    executor = SimpleExecutor()
+    executor.set_cash(1000)
+    expected = executor.execute_strategy(mock_strategy, data, start, end)
+
+    # The strategy is not called on the first bar
+    orders = DataFrame([{'SYMBOL1': 0, 'SYMBOL2': 0}, quantities, quantities], index=data.index)
+    matrix_executor = SimpleExecutor()
+    matrix_executor.set_cash(1000)
+    portfolio = matrix_executor.execute_order_matrix(orders, data, start, end)
+
+    assert portfolio.equals(expected)
+    assert matrix_executor.state['cash'] == executor.state['cash']
+    assert matrix_executor.state['positions']['SYMBOL2']['qty'] == executor.state['positions']['SYMBOL2']['qty']
+
+
+def test_execute_order_matrix_cash_below_zero():
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    executor = SimpleExecutor()
+    executor.set_cash(100)
+    with pytest.raises(Exception, match='Cash is below zero'):
+        executor.execute_order_matrix([[0, 0], [5, 0], [5, 0]], get_data(), start, end)
+
+
+def test_execute_strategy_active_index():
+    # Most symbols miss most bars, only the active ones are valued
+    data = generate_market_data(50, 40, missing=0.8)
+    symbols = list(data['c'].columns)
+    start = datetime.fromtimestamp(data.index[0] / 1000, utc)
+    end = datetime.fromtimestamp(data.index[-1] / 1000, utc)
+
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        for symbol in symbols[:10]:
+            request_new_order(symbol, 1, 'buy', 'limit', 'gtc', 1000.0, None, False, symbol)
+
+    executor = SimpleExecutor()
+    executor.set_cash(1e9)
+    expected = executor.execute_strategy(strategy, data, start, end)
+
+    active_executor = SimpleExecutor()
+    active_executor.set_cash(1e9)
+    portfolio = active_executor.execute_strategy(strategy, BarStore.from_dataframe(data).compact(np.float64), start, end)
+    assert portfolio.equals(expected)
+    for field in ('qty', 'current_price', 'market_value', 'unrealized_pl'):
+        assert active_executor.state['positions'][symbols[0]][field] == executor.state['positions'][symbols[0]][field]
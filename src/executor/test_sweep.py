@@ -0,0 +1,49 @@
+from datetime import datetime
+from pytz import utc
+from executor.simple_executor import SimpleExecutor
+from executor.sweep import parameter_grid, sweep
+from executor.test_simple_executor import get_data
+from util.bar_store import BarStore
+
+
+def buy_strategy_factory(qty, symbol):
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        request_new_order(symbol, qty, 'buy', 'market', 'day', None, None, False, 'order')
+    return strategy
+
+
+def test_parameter_grid():
+    assert parameter_grid({'a': [1, 2], 'b': [3]}) == [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]
+
+
+def test_sweep():
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+
+    curves, summary = sweep(buy_strategy_factory, {'qty': [1, 2], 'symbol': ['SYMBOL1']}, data, start, end, 1000, max_workers=2)
+
+    assert summary['qty'].tolist() == [1, 2]
+    assert len(curves) == 2 * 3
+    for run, qty in enumerate([1, 2]):
+        executor = SimpleExecutor()
+        executor.set_cash(1000)
+        expected = executor.execute_strategy(buy_strategy_factory(qty, 'SYMBOL1'), data, start, end)
+        curve = curves[curves['run'] == run].reset_index(drop=True)
+        assert curve['close'].tolist() == expected['close'].tolist()
+        assert summary['final_value'][run] == expected['close'].iloc[-1]
+
+
+def test_sweep_store_path(tmp_path, monkeypatch):
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    end = datetime(2019, 1, 3, tzinfo=utc)
+    data = get_data()
+    grid = {'qty': [1, 2], 'symbol': ['SYMBOL1']}
+    _, expected = sweep(buy_strategy_factory, grid, data, start, end, 1000, max_workers=2)
+
+    BarStore.from_dataframe(data).save(str(tmp_path))
+    # The workers read the store in place, it is never written again
+    monkeypatch.setattr(BarStore, 'save', None)
+    for bar_store in (str(tmp_path), BarStore.load(str(tmp_path))):
+        _, summary = sweep(buy_strategy_factory, grid, bar_store, start, end, 1000, max_workers=2)
+        assert summary['final_value'].tolist() == expected['final_value'].tolist()
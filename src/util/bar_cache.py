@@ -0,0 +1,125 @@
+import os
+from operator import itemgetter
+import numpy as np
+from util.cache_util import ensure_cache_path_created, get_cache_index, get_file_path
+
+# Normalized bar columns, the only ones the executor reads
+BAR_COLUMNS = ('t', 'o', 'c', 'h', 'l')
+BAR_DTYPES = {'t': np.int64, 'o': np.float64, 'c': np.float64, 'h': np.float64, 'l': np.float64}
+
+
+def empty_bars():
+    from pandas import DataFrame
+    return DataFrame({column: np.empty(0, dtype=BAR_DTYPES[column]) for column in BAR_COLUMNS})
+
+
+def bars_from_columns(columns):
+    from pandas import DataFrame
+    return DataFrame({column: columns[column] for column in BAR_COLUMNS}, copy=False)
+
+
+def parse_bar_records(records):
+    # Typed columns of a list of bar dicts, each column is filled straight
+    # from the records without building intermediate rows. Any other key of
+    # the records is dropped.
+    return {
+        column: np.fromiter(map(itemgetter(column), records), dtype=BAR_DTYPES[column], count=len(records))
+        for column in BAR_COLUMNS
+    }
+
+
+def unique_bars(columns):
+    # Sorted by t, the first bar of every timestamp is kept
+    t, first = np.unique(columns['t'], return_index=True)
+    return {column: t if column == 't' else columns[column][first] for column in BAR_COLUMNS}
+
+
+def concat_bars(pages):
+    return {column: np.concatenate([page[column] for page in pages]) for column in BAR_COLUMNS}
+
+
+def read_bars(file_path):
+    # One npz archive per entry, one array per column plus the time ranges
+    # covered by the entry
+    from pandas import DataFrame
+    with np.load(file_path) as bars:
+        return DataFrame({column: bars[column] for column in BAR_COLUMNS}), bars['ranges'].tolist()
+
+
+def write_bars(file_path, df, ranges):
+    # Written next to the final path and moved in place, so a reader never
+    # sees a partially written archive
+    temp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            ranges=np.array(ranges, dtype=np.int64).reshape(-1, 2),
+            **{column: df[column].to_numpy(dtype=BAR_DTYPES[column]) for column in BAR_COLUMNS}
+        )
+    os.replace(temp_path, file_path)
+
+
+def merge_ranges(ranges):
+    # Inclusive [start, end] ranges, overlapping or adjacent ones are merged
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(start, end, ranges):
+    # Parts of [start, end] not covered by the merged ranges
+    missing = []
+    for range_start, range_end in merge_ranges(ranges):
+        if range_end < start or range_start > end:
+            continue
+        if range_start > start:
+            missing.append([start, range_start - 1])
+        start = max(start, range_end + 1)
+    if start <= end:
+        missing.append([start, end])
+    return missing
+
+
+def merge_bars(dfs):
+    columns = concat_bars([{column: df[column].to_numpy(dtype=BAR_DTYPES[column]) for column in BAR_COLUMNS} for df in dfs])
+    return bars_from_columns(unique_bars(columns))
+
+
+def get_cached_bar_range(namespace, key, start, end, get_df, complete_until=None):
+    # The entry of a key knows the time ranges it holds. get_df(start, end)
+    # is only called for the gaps of [start, end] not cached yet, the new
+    # bars are merged in and any sub range is then served from disk.
+    # Bars after complete_until may still change or be published later, the
+    # gaps are only recorded as cached up to it and fetched again next time.
+    ensure_cache_path_created()
+    file_path = get_file_path(namespace, key, 'npz')
+    cache_index = get_cache_index()
+
+    # Missing, or evicted meanwhile
+    try:
+        df, ranges = read_bars(file_path)
+    except FileNotFoundError:
+        df, ranges = empty_bars(), []
+
+    gaps = missing_ranges(start, end, ranges)
+    if len(gaps) > 0:
+        cache_index.miss()
+        # New bars first, they replace the cached bars of the same timestamp
+        df = merge_bars([get_df(gap_start, gap_end) for gap_start, gap_end in gaps] + [df])
+        if complete_until is not None:
+            gaps = [[gap_start, min(gap_end, complete_until)] for gap_start, gap_end in gaps if gap_start <= complete_until]
+        ranges = merge_ranges(ranges + gaps)
+        write_bars(file_path, df, ranges)
+        cache_index.add(file_path)
+    else:
+        print('Load from cache {namespace} {key}'.format(namespace=namespace, key=key))
+        cache_index.hit(file_path)
+
+    t = df['t'].to_numpy()
+    index_start = np.searchsorted(t, start, side='left')
+    index_end = np.searchsorted(t, end, side='right')
+    return df.iloc[index_start:index_end].reset_index(drop=True)
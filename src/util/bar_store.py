@@ -0,0 +1,269 @@
+import os
+from collections.abc import Mapping
+import numpy as np
+
+FIELDS = ('o', 'h', 'l', 'c')
+# Rows scanned at once when indexing the active symbols of a memory mapped
+# store
+ACTIVE_INDEX_ROWS = 4096
+
+
+class BarStore:
+    # Columnar store of the pivoted market data. Every field is a contiguous
+    # (timestamps x symbols) float array, rows are addressed in O(1) through
+    # the timestamp index and columns through the symbol index.
+    def __init__(self, timestamps, symbols, o, h, l, c):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.symbols = list(symbols)
+        self.o = o
+        self.h = h
+        self.l = l
+        self.c = c
+        self.symbol_index = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.timestamp_index = {int(t): index for index, t in enumerate(self.timestamps)}
+        # Optional index of the symbols with a bar at every timestamp, in CSR
+        # layout: the columns active at row i are
+        # active_symbols[active_ptr[i]:active_ptr[i + 1]]
+        self.active_ptr = None
+        self.active_symbols = None
+        # Directory the store was loaded from
+        self.path = None
+        for field in FIELDS:
+            assert getattr(self, field).shape == (len(self.timestamps), len(self.symbols)), \
+                'Field {} has shape {}'.format(field, getattr(self, field).shape)
+
+    @classmethod
+    def from_dataframe(cls, df, dtype=np.float64):
+        # Expects the frame returned by get_stocks_aggregate_data: one row per
+        # timestamp and a (field, symbol) column multi index
+        symbols = list(df['o'].columns)
+        arrays = {
+            field: np.ascontiguousarray(df[field][symbols].to_numpy(dtype=dtype))
+            for field in FIELDS
+        }
+        return cls(df.index.to_numpy(dtype=np.int64), symbols, **arrays)
+
+    def compact(self, dtype=np.float32):
+        # Copy with float32 prices, half the memory of the default layout,
+        # and the index of the active symbols
+        arrays = {field: self.field(field).astype(dtype) for field in FIELDS}
+        return BarStore(self.timestamps, self.symbols, **arrays).index_active()
+
+    def index_active(self):
+        # A symbol is active at a timestamp when any of its fields is set.
+        # Illiquid symbols miss most of the bars, per bar work of the executor
+        # then scales with the active symbols instead of the whole universe.
+        counts = np.zeros(len(self.timestamps), dtype=np.int64)
+        active_symbols = []
+        for start in range(0, len(self.timestamps), ACTIVE_INDEX_ROWS):
+            rows = slice(start, start + ACTIVE_INDEX_ROWS)
+            active = np.zeros(self.o[rows].shape, dtype=np.bool_)
+            for field in FIELDS:
+                active |= ~np.isnan(self.field(field)[rows])
+            counts[rows] = active.sum(axis=1)
+            active_symbols.append(np.nonzero(active)[1].astype(np.int32))
+        self.active_ptr = np.concatenate([[0], np.cumsum(counts)])
+        self.active_symbols = np.concatenate(active_symbols) if active_symbols else np.empty(0, dtype=np.int32)
+        return self
+
+    def active_at(self, index):
+        return self.active_symbols[self.active_ptr[index]:self.active_ptr[index + 1]]
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        # By default the fields are memory mapped, processes loading the same
+        # path share the pages through the OS page cache
+        arrays = {
+            field: np.load(os.path.join(path, '{}.npy'.format(field)), mmap_mode=mmap_mode)
+            for field in FIELDS
+        }
+        timestamps = np.load(os.path.join(path, 'timestamps.npy'))
+        symbols = np.load(os.path.join(path, 'symbols.npy')).tolist()
+        bar_store = cls(timestamps, symbols, **arrays)
+        bar_store.path = path
+        if os.path.exists(os.path.join(path, 'active_ptr.npy')):
+            bar_store.active_ptr = np.load(os.path.join(path, 'active_ptr.npy'))
+            bar_store.active_symbols = np.load(os.path.join(path, 'active_symbols.npy'), mmap_mode=mmap_mode)
+        return bar_store
+
+    @classmethod
+    def create(cls, path, timestamps, symbols, dtype=np.float64):
+        # Memory mapped store filled with NaN, to be written column by column
+        # without ever holding the whole matrices in memory
+        os.makedirs(path)
+        shape = (len(timestamps), len(symbols))
+        arrays = {}
+        for field in FIELDS:
+            array = np.lib.format.open_memmap(os.path.join(path, '{}.npy'.format(field)), mode='w+', dtype=dtype, shape=shape)
+            array[:] = np.nan
+            arrays[field] = array
+        bar_store = cls(timestamps, symbols, **arrays)
+        bar_store._save_index(path)
+        return bar_store
+
+    def _save_index(self, path):
+        np.save(os.path.join(path, 'timestamps.npy'), self.timestamps)
+        np.save(os.path.join(path, 'symbols.npy'), np.array(self.symbols, dtype=str))
+        if self.active_ptr is not None:
+            self.save_active_index(path)
+
+    def save_active_index(self, path):
+        np.save(os.path.join(path, 'active_ptr.npy'), self.active_ptr)
+        np.save(os.path.join(path, 'active_symbols.npy'), self.active_symbols)
+
+    def save(self, path):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for field in FIELDS:
+            np.save(os.path.join(path, '{}.npy'.format(field)), self.field(field))
+        self._save_index(path)
+
+    def flush(self):
+        for field in FIELDS:
+            if isinstance(self.field(field), np.memmap):
+                self.field(field).flush()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def field(self, field):
+        assert field in FIELDS, 'Field not supported {}'.format(field)
+        return getattr(self, field)
+
+    def row(self, timestamp_ms):
+        return self.row_at(self.timestamp_index[timestamp_ms])
+
+    def row_at(self, index):
+        return BarRow(self, index)
+
+    def to_frame(self):
+        # The frame is a view on the fields, a memory mapped store stays on
+        # disk until rows are read. Without copy on write (pandas < 3) concat
+        # copies unless told not to, pandas 3 deprecates the keyword.
+        import pandas
+        from pandas import DataFrame, Index, concat
+        copy = {} if int(pandas.__version__.split('.')[0]) >= 3 else {'copy': False}
+        index = Index(self.timestamps, name='t')
+        columns = Index(self.symbols, name='symbol')
+        return concat(
+            [DataFrame(self.field(field), index=index, columns=columns, copy=False) for field in FIELDS],
+            axis=1,
+            keys=FIELDS,
+            **copy
+        )
+
+
+class BarRow(Mapping):
+    # Read only view of a single bar, indexable as row['h'][symbol]
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.timestamp = int(store.timestamps[index])
+
+    def __getitem__(self, field):
+        return FieldRow(self.store, self.store.field(field)[self.index])
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+
+class FieldRow(Mapping):
+    # Maps symbol -> value without copying the underlying row
+    def __init__(self, store, values):
+        self.store = store
+        self.values = values
+
+    def __getitem__(self, symbol):
+        return self.values[self.store.symbol_index[symbol]]
+
+    def __iter__(self):
+        return iter(self.store.symbols)
+
+    def __len__(self):
+        return len(self.store.symbols)
+
+
+class BarStoreBuilder:
+    # Assembles a BarStore symbol by symbol, writing the bars of each symbol
+    # straight into preallocated (timestamps x symbols) arrays as they arrive.
+    # Rows are appended in arrival order and only sorted once in build, so
+    # peak memory stays close to the size of the final store.
+    def __init__(self, symbols, capacity=1024, dtype=np.float64):
+        self.symbols = sorted(symbols)
+        self.symbol_index = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.dtype = dtype
+        self.rows = 0
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        # Sorted timestamps and their row, to map incoming bars to rows
+        self.sorted_timestamps = np.empty(0, dtype=np.int64)
+        self.sorted_rows = np.empty(0, dtype=np.int64)
+        self.filled = np.zeros(len(self.symbols), dtype=np.bool_)
+        self.arrays = {field: np.full((capacity, len(self.symbols)), np.nan, dtype=dtype) for field in FIELDS}
+
+    def __len__(self):
+        return int(self.filled.sum())
+
+    def _grow(self, rows):
+        # Grows by a quarter at least, most symbols share the same timestamps
+        # so rows stop growing after the first symbols
+        capacity = max(rows, len(self.timestamps) + len(self.timestamps) // 4)
+        timestamps = np.empty(capacity, dtype=np.int64)
+        timestamps[:self.rows] = self.timestamps[:self.rows]
+        self.timestamps = timestamps
+        for field in FIELDS:
+            array = np.full((capacity, len(self.symbols)), np.nan, dtype=self.dtype)
+            array[:self.rows] = self.arrays[field][:self.rows]
+            self.arrays[field] = array
+
+    def _rows_of(self, timestamps):
+        timestamps = np.unique(timestamps)
+        positions = np.searchsorted(self.sorted_timestamps, timestamps)
+        known = positions < len(self.sorted_timestamps)
+        known[known] = self.sorted_timestamps[positions[known]] == timestamps[known]
+        new_timestamps = timestamps[~known]
+        if len(new_timestamps) > 0:
+            if self.rows + len(new_timestamps) > len(self.timestamps):
+                self._grow(self.rows + len(new_timestamps))
+            new_rows = np.arange(self.rows, self.rows + len(new_timestamps))
+            self.timestamps[new_rows] = new_timestamps
+            self.rows += len(new_timestamps)
+            insert_at = np.searchsorted(self.sorted_timestamps, new_timestamps)
+            self.sorted_timestamps = np.insert(self.sorted_timestamps, insert_at, new_timestamps)
+            self.sorted_rows = np.insert(self.sorted_rows, insert_at, new_rows)
+        return timestamps, self.sorted_rows[np.searchsorted(self.sorted_timestamps, timestamps)]
+
+    def add(self, symbol, df):
+        # df holds the bars of one symbol, one row per timestamp in column t
+        column = self.symbol_index[symbol]
+        if len(df) == 0:
+            return
+        t = df['t'].to_numpy(dtype=np.int64)
+        timestamps, rows = self._rows_of(t)
+        rows = rows[np.searchsorted(timestamps, t)]
+        for field in FIELDS:
+            self.arrays[field][rows, column] = df[field].to_numpy()
+        self.filled[column] = True
+
+    def _store(self, release):
+        # Sorted by timestamp, without the symbols that never had a bar
+        columns = np.flatnonzero(self.filled)
+        select = np.ix_(self.sorted_rows, columns)
+        arrays = {}
+        for field in FIELDS:
+            arrays[field] = self.arrays[field][select]
+            if release:
+                self.arrays[field] = None
+        symbols = [self.symbols[column] for column in columns]
+        return BarStore(self.sorted_timestamps.copy(), symbols, **arrays)
+
+    def build(self):
+        # The builder gives up its arrays one field at a time
+        return self._store(release=True)
+
+    def snapshot(self):
+        # Copy of what has been added so far, usable while more symbols are
+        # still being added
+        return self._store(release=False)
@@ -1,7 +1,23 @@
+import fcntl
+import json
 import os
 import pickle
+import threading
+import time
+from contextlib import contextmanager
 
 CACHE_PATH = '/tmp/cache'
+# Byte budget of the cache directory, unbounded when not set
+CACHE_MAX_BYTES = int(os.environ['CACHE_MAX_BYTES']) if os.environ.get('CACHE_MAX_BYTES') else None
+# Eviction policy once the budget is exceeded, 'lru' or 'lfu'
+CACHE_POLICY = os.environ.get('CACHE_POLICY', 'lru')
+CACHE_INDEX_FILE = 'cache_index.json'
+# Changes of the index appended since the index file was written
+CACHE_JOURNAL_FILE = 'cache_index.journal'
+# Hits are appended to the journal every this many hits
+INDEX_SAVE_EVERY = 100
+# The index file is rewritten and the journal emptied every this many lines
+JOURNAL_COMPACT_EVERY = 1000
 
 
 def ensure_cache_path_created():
@@ -9,32 +25,290 @@ def ensure_cache_path_created():
         os.makedirs(CACHE_PATH)
 
 
+class CacheIndex:
+    # Sizes, access times and hit counts of the cached files, kept in an index
+    # file in the cache directory so that the size of the cache is known
+    # without listing it. Counters are per process.
+    #
+    # Processes sharing the directory append their changes to a journal under
+    # a file lock and replay the changes of the others before deciding what
+    # to evict, so a write costs one line instead of rewriting the index. The
+    # journal is folded into the index file once it grows long.
+    def __init__(self, path, max_bytes=None, policy='lru'):
+        assert policy in ('lru', 'lfu'), 'Policy not supported {}'.format(policy)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.unsaved_hits = 0
+        # Hits not in the journal yet, name -> [accessed_at, hits]
+        self.pending_hits = {}
+        self.entries = {}
+        self.size = 0
+        # Version of the index file the entries were read from, and bytes
+        # and lines of the journal replayed since
+        self.index_version = None
+        self.journal_offset = 0
+        self.journal_lines = 0
+        with self.locked():
+            self.load()
+
+    def index_path(self):
+        return os.path.join(self.path, CACHE_INDEX_FILE)
+
+    def journal_path(self):
+        return os.path.join(self.path, CACHE_JOURNAL_FILE)
+
+    @contextmanager
+    def locked(self):
+        # Between the threads of the process, then between processes
+        with self.lock, file_lock(self.index_path(), exclusive=True):
+            yield
+
+    def _version(self):
+        stat = os.stat(self.index_path())
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def load(self):
+        if os.path.exists(self.index_path()):
+            with open(self.index_path()) as f:
+                self.entries = json.load(f)
+            self.index_version = self._version()
+            self.journal_offset = 0
+            self.journal_lines = 0
+        else:
+            self.rebuild()
+        self.size = sum(entry['size'] for entry in self.entries.values())
+        for name, (accessed_at, hits) in self.pending_hits.items():
+            self._apply({'name': name, 'accessed_at': accessed_at, 'hits': hits})
+        self.sync()
+
+    def sync(self):
+        # Replays the journal lines appended by other processes, from the
+        # start when another process rewrote the index file. Called with the
+        # lock held.
+        if not os.path.exists(self.index_path()) or self._version() != self.index_version:
+            self.load()
+            return
+        if not os.path.exists(self.journal_path()):
+            return
+        with open(self.journal_path()) as f:
+            f.seek(self.journal_offset)
+            for line in f:
+                self._apply(json.loads(line))
+                self.journal_lines += 1
+            self.journal_offset = f.tell()
+
+    def _apply(self, record):
+        name = record['name']
+        entry = self.entries.get(name)
+        if record.get('removed'):
+            if entry is not None:
+                self.size -= self.entries.pop(name)['size']
+        elif 'size' in record:
+            self.size += record['size'] - (entry['size'] if entry else 0)
+            self.entries[name] = {
+                'size': record['size'],
+                'accessed_at': record['accessed_at'],
+                'hits': entry['hits'] if entry else 0,
+            }
+        elif entry is not None:
+            entry['accessed_at'] = max(entry['accessed_at'], record['accessed_at'])
+            entry['hits'] += record['hits']
+
+    def _append(self, records):
+        # Records are applied to the entries by the caller. Called with the
+        # lock held, after sync.
+        records = [
+            {'name': name, 'accessed_at': accessed_at, 'hits': hits}
+            for name, (accessed_at, hits) in self.pending_hits.items()
+        ] + records
+        self.pending_hits = {}
+        self.unsaved_hits = 0
+        if len(records) == 0:
+            return
+        with open(self.journal_path(), 'a') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+            self.journal_offset = f.tell()
+        self.journal_lines += len(records)
+        if self.journal_lines >= JOURNAL_COMPACT_EVERY:
+            self.save()
+
+    def rebuild(self):
+        # Only needed once for a cache directory created without an index
+        now = time.time()
+        self.entries = {
+            name: {'size': os.path.getsize(os.path.join(self.path, name)), 'accessed_at': now, 'hits': 0}
+            for name in os.listdir(self.path)
+            if name not in (CACHE_INDEX_FILE, CACHE_JOURNAL_FILE) and not name.endswith(('.tmp', '.lock')) and os.path.isfile(os.path.join(self.path, name))
+        }
+        self.size = sum(entry['size'] for entry in self.entries.values())
+        self.save()
+
+    def save(self):
+        # Folds the journal into the index file. Called with the lock held,
+        # after sync.
+        temp_path = '{}.{}.tmp'.format(self.index_path(), os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.index_path())
+        open(self.journal_path(), 'w').close()
+        self.index_version = self._version()
+        self.journal_offset = 0
+        self.journal_lines = 0
+
+    def refresh(self):
+        with self.locked():
+            self.sync()
+            self._append([])
+
+    def hit(self, file_path):
+        with self.lock:
+            self.hits += 1
+            name = os.path.basename(file_path)
+            now = time.time()
+            entry = self.entries.get(name)
+            if entry is not None:
+                entry['accessed_at'] = now
+                entry['hits'] += 1
+            pending = self.pending_hits.setdefault(name, [now, 0])
+            pending[0] = now
+            pending[1] += 1
+            self.unsaved_hits += 1
+            if self.unsaved_hits >= INDEX_SAVE_EVERY:
+                self.refresh()
+
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def add(self, file_path):
+        with self.locked():
+            self.sync()
+            record = {'name': os.path.basename(file_path), 'size': os.path.getsize(file_path), 'accessed_at': time.time()}
+            self._apply(record)
+            self._append([record])
+            self.evict(keep=record['name'])
+
+    def eviction_key(self, name):
+        entry = self.entries[name]
+        if self.policy == 'lfu':
+            return (entry['hits'], entry['accessed_at'])
+        return entry['accessed_at']
+
+    def evict(self, keep=None):
+        # Called with the lock held, after sync
+        if self.max_bytes is None or self.size <= self.max_bytes:
+            return
+        # Least recently (or frequently) used first, never the entry just added
+        removed = []
+        for name in sorted(self.entries, key=self.eviction_key):
+            if self.size <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            file_path = os.path.join(self.path, name)
+            # Not while a process reads or writes the entry. Waiting could
+            # deadlock with a writer holding the entry waiting for the index.
+            try:
+                with file_lock(file_path, exclusive=True, blocking=False):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+            except BlockingIOError:
+                continue
+            self._apply({'name': name, 'removed': True})
+            removed.append({'name': name, 'removed': True})
+            self.evictions += 1
+        self._append(removed)
+
+
+_cache_index = None
+
+
+def get_cache_index():
+    global _cache_index
+    ensure_cache_path_created()
+    if _cache_index is None or _cache_index.path != CACHE_PATH:
+        _cache_index = CacheIndex(CACHE_PATH, CACHE_MAX_BYTES, CACHE_POLICY)
+    return _cache_index
+
+
+def set_cache_max_bytes(max_bytes, policy=None):
+    cache_index = get_cache_index()
+    with cache_index.locked():
+        cache_index.max_bytes = max_bytes
+        if policy is not None:
+            assert policy in ('lru', 'lfu'), 'Policy not supported {}'.format(policy)
+            cache_index.policy = policy
+        cache_index.sync()
+        cache_index._append([])
+        cache_index.evict()
+
+
 def get_cached_dict(namespace, key, get_dict):
     ensure_cache_path_created()
     file_path = get_file_path(namespace, key, 'pickle')
+    cache_index = get_cache_index()
 
-    if os.path.exists(file_path):
-        print('Load from cache {namespace} {key}'.format(namespace=namespace, key=key))
+    # A file evicted meanwhile is a miss
+    try:
         with open(file_path, 'rb') as f:
+            print('Load from cache {namespace} {key}'.format(namespace=namespace, key=key))
+            cache_index.hit(file_path)
             return pickle.load(f)
+    except FileNotFoundError:
+        pass
 
+    cache_index.miss()
     d = get_dict()
     with open(file_path, 'wb') as f:
         pickle.dump(d, f)
+    cache_index.add(file_path)
 
     return d
 
 
+@contextmanager
+def file_lock(file_path, exclusive, blocking=True):
+    # Advisory lock shared between processes, many readers or one writer.
+    # Raises BlockingIOError when not blocking and the lock is taken.
+    with open('{}.lock'.format(file_path), 'a') as f:
+        fcntl.flock(f, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
 def get_cached_dataframe(namespace, key, get_df):
+    # One file per key, so entries don't share a store, guarded by a lock file
+    # so that concurrent processes never read a partially written frame nor
+    # compute the same frame twice
+    from pandas import read_pickle
     ensure_cache_path_created()
-    file_path = get_file_path(namespace, ext='h5')
+    file_path = get_file_path(namespace, key, 'pickle')
+    cache_index = get_cache_index()
 
-    with pd.HDFStore(file_path) as store:
-        if key in store.keys():
-            return store[key]
-        else:
-            df = get_df()
-            store[key] = df
+    with file_lock(file_path, exclusive=False):
+        if os.path.exists(file_path):
+            print('Load from cache {namespace} {key}'.format(namespace=namespace, key=key))
+            cache_index.hit(file_path)
+            return read_pickle(file_path)
+
+    with file_lock(file_path, exclusive=True):
+        # Another process might have written it while waiting for the lock
+        if os.path.exists(file_path):
+            cache_index.hit(file_path)
+            return read_pickle(file_path)
+        cache_index.miss()
+        df = get_df()
+        temp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        df.to_pickle(temp_path, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+        cache_index.add(file_path)
 
     return df
 
@@ -49,10 +323,20 @@ def get_file_path(namespace, key=None, ext=None):
 
 
 def cache_size():
-    ensure_cache_path_created()
-    return sum(
-        os.path.getsize(os.path.join(CACHE_PATH, f))
-        for f
-        in os.listdir(CACHE_PATH)
-        if os.path.isfile(os.path.join(CACHE_PATH, f))
-    )
+    cache_index = get_cache_index()
+    cache_index.refresh()
+    return cache_index.size
+
+
+def cache_stats():
+    cache_index = get_cache_index()
+    cache_index.refresh()
+    return {
+        'hits': cache_index.hits,
+        'misses': cache_index.misses,
+        'evictions': cache_index.evictions,
+        'size': cache_index.size,
+        'entries': len(cache_index.entries),
+        'max_bytes': cache_index.max_bytes,
+        'policy': cache_index.policy,
+    }
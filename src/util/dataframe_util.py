@@ -1,5 +1,6 @@
 def get_values_at_timestamp(df, timestamp_ms):
+    row = df.loc[timestamp_ms]
     return {
-        level: {symbol:df[level].to_dict()[symbol][timestamp_ms] for symbol in df[level].to_dict()}
+        level: row[level].to_dict()
         for level in ('o', 'c', 'l', 'h')
-    }
\ No newline at end of file
+    }
@@ -3,4 +3,11 @@ from math import isnan
 def force_finite(n, default=0):
     if isnan(n):
         return default
-    return n
\ No newline at end of file
+    return n
+
+
+def as_quantity(n):
+    # Quantities are stored as floats, whole ones are returned as int like
+    # the strategies pass them
+    n = float(n)
+    return int(n) if n.is_integer() else n
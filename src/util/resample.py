@@ -0,0 +1,155 @@
+import os
+import shutil
+import numpy as np
+from util.bar_store import FIELDS, BarStore
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+# Daily bars follow the trading days of the US markets
+DAY_TIMEZONE = 'US/Eastern'
+# Rows rolled up at once
+RESAMPLE_ROWS = 4096
+
+# Length of the bars of every timeframe
+TIMEFRAMES = {
+    '5m': 5 * MINUTE_MS,
+    '15m': 15 * MINUTE_MS,
+    '1h': HOUR_MS,
+    '1d': DAY_MS,
+}
+
+
+def get_utc_offsets(timestamps, timezone):
+    # UTC offset in ms of timezone at every timestamp. Offsets only change on
+    # whole hours, they are looked up once per distinct hour.
+    import pytz
+    from datetime import datetime
+    tz = pytz.timezone(timezone)
+    hours, inverse = np.unique(timestamps // HOUR_MS, return_inverse=True)
+    offsets = np.array([
+        int(datetime.fromtimestamp(int(hour) * 3600, pytz.utc).astimezone(tz).utcoffset().total_seconds()) * 1000
+        for hour in hours
+    ], dtype=np.int64)
+    return offsets[inverse.reshape(-1)]
+
+
+def get_buckets(timestamps, timeframe, offset_ms=0):
+    # Start of the bucket of every timestamp and the first row of every
+    # bucket. Buckets are aligned on multiples of the timeframe since the
+    # epoch, shifted by offset_ms, timestamps must be sorted. Daily buckets
+    # are the calendar days of DAY_TIMEZONE starting at its midnight, so
+    # after hours bars stay in their trading day.
+    assert timeframe in TIMEFRAMES, 'Timeframe not supported {}'.format(timeframe)
+    period_ms = TIMEFRAMES[timeframe]
+    if timeframe == '1d' and len(timestamps) > 0:
+        # Local midnight of every bar, back to UTC with the offset in effect
+        # at midnight, which differs from the bar's on the DST changes
+        local_days = (timestamps + get_utc_offsets(timestamps, DAY_TIMEZONE) - offset_ms) // period_ms * period_ms + offset_ms
+        days, inverse = np.unique(local_days, return_inverse=True)
+        days = days - get_utc_offsets(days - get_utc_offsets(days, DAY_TIMEZONE), DAY_TIMEZONE)
+        buckets = days[inverse.reshape(-1)]
+    else:
+        buckets = (timestamps - offset_ms) // period_ms * period_ms + offset_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) if len(buckets) > 0 else np.empty(0, dtype=np.int64)
+    return buckets[starts], starts
+
+
+def _first_valid(values, starts, last=False):
+    # First (or last) non NaN value of every bucket along axis 0, NaN when
+    # the bucket has none. The row of every valid value is reduced per
+    # bucket and used to gather the values.
+    rows = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    valid = ~np.isnan(values)
+    if last:
+        row = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+    else:
+        row = np.minimum.reduceat(np.where(valid, rows, len(values)), starts, axis=0)
+    found = (row >= 0) & (row < len(values))
+    row = np.where(found, row, 0)
+    return np.where(found, np.take_along_axis(values, row, axis=0), np.nan)
+
+
+def _resample_blocks(starts, count, fields, out):
+    # Rolls up the buckets in blocks of consecutive buckets spanning about
+    # RESAMPLE_ROWS rows, a bucket longer than that is a block by itself.
+    # Temporaries stay the size of a block on memory mapped fields.
+    bounds = np.r_[starts, count]
+    bucket = 0
+    while bucket < len(starts):
+        next_bucket = max(bucket + 1, int(np.searchsorted(bounds, bounds[bucket] + RESAMPLE_ROWS, side='right')) - 1)
+        rows = slice(bounds[bucket], bounds[next_bucket])
+        block_starts = starts[bucket:next_bucket] - bounds[bucket]
+        buckets = slice(bucket, next_bucket)
+        out['o'][buckets] = _first_valid(fields['o'][rows], block_starts)
+        out['h'][buckets] = np.fmax.reduceat(fields['h'][rows], block_starts, axis=0)
+        out['l'][buckets] = np.fmin.reduceat(fields['l'][rows], block_starts, axis=0)
+        out['c'][buckets] = _first_valid(fields['c'][rows], block_starts, last=True)
+        bucket = next_bucket
+    return out
+
+
+def resample_fields(timestamps, fields, timeframe, offset_ms=0):
+    # fields maps o/h/l/c to arrays with one row per timestamp, 1d for a
+    # single symbol or 2d with one column per symbol. Returns the bucket
+    # timestamps and the rolled up fields: first open, highest high, lowest
+    # low and last close, ignoring missing bars.
+    t, starts = get_buckets(np.asarray(timestamps, dtype=np.int64), timeframe, offset_ms)
+    out = {
+        field: np.empty((len(starts),) + values.shape[1:], dtype=values.dtype)
+        for field, values in fields.items()
+    }
+    return t, _resample_blocks(starts, len(timestamps), fields, out)
+
+
+def resample_bars(df, timeframe, offset_ms=0):
+    # Bars of a single symbol, the frame returned by get_aggregate_symbol
+    from pandas import DataFrame
+    df = df.sort_values('t', kind='stable')
+    t, fields = resample_fields(
+        df['t'].to_numpy(dtype=np.int64),
+        {field: df[field].to_numpy(dtype=np.float64) for field in FIELDS},
+        timeframe,
+        offset_ms
+    )
+    resampled = DataFrame({'t': t, 'o': fields['o'], 'c': fields['c'], 'h': fields['h'], 'l': fields['l']})
+    if 'symbol' in df:
+        resampled['symbol'] = df['symbol'].iloc[0] if len(df) > 0 else None
+    return resampled
+
+
+def resample_bar_store(bar_store, timeframe, offset_ms=0, path=None):
+    # With a path the rollup is written to a memory mapped store created
+    # there, neither the fields nor the rollup are ever whole in memory
+    t, starts = get_buckets(bar_store.timestamps, timeframe, offset_ms)
+    if path is None:
+        dtype = bar_store.o.dtype
+        rollup = BarStore(t, bar_store.symbols, **{field: np.empty((len(t), len(bar_store.symbols)), dtype=dtype) for field in FIELDS})
+    else:
+        rollup = BarStore.create(path, t, bar_store.symbols, dtype=bar_store.o.dtype)
+    _resample_blocks(starts, len(bar_store), {field: bar_store.field(field) for field in FIELDS}, {field: rollup.field(field) for field in FIELDS})
+    if bar_store.active_ptr is not None:
+        rollup.index_active()
+        if path is not None:
+            rollup.save_active_index(path)
+    rollup.flush()
+    return rollup
+
+
+def get_rollup_path(path, timeframe, offset_ms=0):
+    return os.path.join(path, 'rollup_{}_{}'.format(timeframe, offset_ms))
+
+
+def get_rollup(path, timeframe, offset_ms=0):
+    # Rollup of the bar store saved in path, computed once and saved next to
+    # its fields, then memory mapped like the store itself
+    rollup_path = get_rollup_path(path, timeframe, offset_ms)
+    if not os.path.exists(rollup_path):
+        temp_path = '{}.{}.tmp'.format(rollup_path, os.getpid())
+        resample_bar_store(BarStore.load(path), timeframe, offset_ms, temp_path)
+        try:
+            os.rename(temp_path, rollup_path)
+        except OSError:
+            # Saved by another process in the meantime
+            shutil.rmtree(temp_path)
+    return BarStore.load(rollup_path)
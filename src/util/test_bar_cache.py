@@ -0,0 +1,94 @@
+import pytest
+from pandas import DataFrame
+import util.cache_util
+from util.bar_cache import concat_bars, get_cached_bar_range, merge_ranges, missing_ranges, parse_bar_records, unique_bars
+
+
+@pytest.fixture(autouse=True)
+def cache_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(util.cache_util, 'CACHE_PATH', str(tmp_path))
+
+
+def get_bars(start, end):
+    t = list(range(start - start % 10, end + 1, 10))
+    return DataFrame({'t': t, 'o': 1.0, 'c': 2.0, 'h': 3.0, 'l': 0.5})
+
+
+def test_merge_ranges():
+    assert merge_ranges([[20, 30], [0, 9], [10, 19], [25, 35], [40, 50]]) == [[0, 35], [40, 50]]
+
+
+def test_missing_ranges():
+    assert missing_ranges(0, 100, []) == [[0, 100]]
+    assert missing_ranges(0, 100, [[20, 30], [50, 60]]) == [[0, 19], [31, 49], [61, 100]]
+    assert missing_ranges(25, 55, [[20, 30], [50, 60]]) == [[31, 49]]
+    assert missing_ranges(20, 30, [[0, 100]]) == []
+
+
+def test_parse_bar_records():
+    pages = [
+        parse_bar_records([
+            {'t': 3000, 'o': 3, 'c': 3.5, 'h': 4, 'l': 2, 'v': 100, 'n': 5},
+            {'t': 1000, 'o': 1, 'c': 1.5, 'h': 2, 'l': 0.5, 'v': 100, 'n': 5},
+        ]),
+        parse_bar_records([
+            {'t': 1000, 'o': 9, 'c': 9, 'h': 9, 'l': 9, 'vw': 1},
+            {'t': 2000, 'o': 2, 'c': 2.5, 'h': 3, 'l': 1.5, 'vw': 1},
+        ]),
+        parse_bar_records([]),
+    ]
+    columns = unique_bars(concat_bars(pages))
+    assert list(columns) == ['t', 'o', 'c', 'h', 'l']
+    assert columns['t'].dtype == 'int64'
+    assert columns['t'].tolist() == [1000, 2000, 3000]
+    # First bar of a timestamp is kept
+    assert columns['o'].tolist() == [1.0, 2.0, 3.0]
+    assert columns['l'].tolist() == [0.5, 1.5, 2.0]
+
+
+def test_get_cached_bar_range_fetches_only_gaps():
+    calls = []
+
+    def get_df(start, end):
+        calls.append([start, end])
+        return get_bars(start, end)
+
+    df = get_cached_bar_range('bars', 'SYMBOL1', 100, 200, get_df)
+    assert df['t'].tolist() == list(range(100, 201, 10))
+    assert calls == [[100, 200]]
+
+    # Extending the range downloads only the new part
+    df = get_cached_bar_range('bars', 'SYMBOL1', 100, 250, get_df)
+    assert df['t'].tolist() == list(range(100, 251, 10))
+    assert calls == [[100, 200], [201, 250]]
+
+    # Sub ranges are served from disk
+    df = get_cached_bar_range('bars', 'SYMBOL1', 150, 220, get_df)
+    assert df['t'].tolist() == list(range(150, 221, 10))
+    assert len(calls) == 2
+
+
+def test_get_cached_bar_range_fetches_incomplete_bars_again():
+    calls = []
+    published_until = [150]
+
+    def get_df(start, end):
+        calls.append([start, end])
+        bars = get_bars(start, min(end, published_until[0]))
+        # The latest bar is still forming
+        bars.loc[bars['t'] == published_until[0], 'c'] = 1.0
+        return bars
+
+    df = get_cached_bar_range('bars', 'SYMBOL1', 100, 250, get_df, complete_until=145)
+    assert df['t'].tolist() == list(range(100, 151, 10))
+
+    # Fewer bars than requested were served, the rest is fetched later
+    published_until[0] = 250
+    df = get_cached_bar_range('bars', 'SYMBOL1', 100, 250, get_df, complete_until=250)
+    assert calls == [[100, 250], [146, 250]]
+    assert df['t'].tolist() == list(range(100, 251, 10))
+    # The bar that was forming is replaced
+    assert df.loc[df['t'] == 150, 'c'].tolist() == [2.0]
+
+    df = get_cached_bar_range('bars', 'SYMBOL1', 100, 250, get_df, complete_until=250)
+    assert len(calls) == 2
@@ -0,0 +1,96 @@
+import numpy as np
+from pandas import DataFrame, concat, pivot
+import util.bar_store
+from util.bar_store import FIELDS, BarStore, BarStoreBuilder
+from util.dataframe_util import get_values_at_timestamp
+from executor.test_simple_executor import get_data
+
+
+def test_from_dataframe():
+    data = get_data()
+    bar_store = BarStore.from_dataframe(data)
+    assert bar_store.symbols == ['SYMBOL1', 'SYMBOL2']
+    assert len(bar_store) == 3
+    for field in ('o', 'h', 'l', 'c'):
+        assert bar_store.field(field).shape == (3, 2)
+        assert bar_store.field(field).flags['C_CONTIGUOUS']
+    assert bar_store.timestamp_index[int(data.index[1])] == 1
+
+
+def test_row():
+    data = get_data()
+    bar_store = BarStore.from_dataframe(data)
+    timestamp_ms = int(data.index[1])
+    row = bar_store.row(timestamp_ms)
+    assert row.timestamp == timestamp_ms
+    assert row['h']['SYMBOL2'] == 15
+    assert np.shares_memory(row['h'].values, bar_store.h)
+    assert dict(row['o']) == get_values_at_timestamp(data, timestamp_ms)['o']
+
+
+def test_to_frame():
+    data = get_data()
+    frame = BarStore.from_dataframe(data).to_frame()
+    assert list(frame.index) == list(data.index)
+    assert frame['c']['SYMBOL1'].tolist() == data['c']['SYMBOL1'].tolist()
+
+
+def test_to_frame_shares_memory(tmp_path):
+    BarStore.from_dataframe(get_data()).save(str(tmp_path))
+    bar_store = BarStore.load(str(tmp_path))
+    frame = bar_store.to_frame()
+    for field in FIELDS:
+        assert np.shares_memory(frame[field].to_numpy(), bar_store.field(field))
+        assert np.shares_memory(frame.iloc[1:][field].to_numpy(), bar_store.field(field))
+
+
+def test_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(util.bar_store, 'ACTIVE_INDEX_ROWS', 2)
+    c = np.array([
+        [1.0, np.nan, 3.0],
+        [np.nan, np.nan, np.nan],
+        [1.5, 2.5, np.nan],
+    ])
+    bar_store = BarStore([1000, 2000, 3000], ['SYMBOL1', 'SYMBOL2', 'SYMBOL3'], o=c, h=c, l=c, c=c)
+    compact = bar_store.compact()
+    assert compact.c.dtype == np.float32
+    assert compact.c.nbytes == bar_store.c.nbytes // 2
+    assert [compact.active_at(index).tolist() for index in range(3)] == [[0, 2], [], [0, 1]]
+
+    compact.save(str(tmp_path))
+    loaded = BarStore.load(str(tmp_path))
+    assert loaded.active_ptr.tolist() == compact.active_ptr.tolist()
+    assert loaded.active_symbols.tolist() == compact.active_symbols.tolist()
+    np.testing.assert_array_equal(loaded.c, compact.c)
+
+
+def get_symbol_bars(symbol, timestamps, seed):
+    rng = np.random.default_rng(seed)
+    return DataFrame({
+        't': timestamps,
+        'o': rng.random(len(timestamps)),
+        'c': rng.random(len(timestamps)),
+        'h': rng.random(len(timestamps)),
+        'l': rng.random(len(timestamps)),
+        'symbol': symbol,
+    })
+
+
+def test_builder_same_as_pivot():
+    dfs = [
+        get_symbol_bars('SYMBOL3', [30, 10, 20], 0),
+        get_symbol_bars('SYMBOL1', [50, 20], 1),
+        get_symbol_bars('SYMBOL2', list(range(0, 100, 5)), 2),
+        get_symbol_bars('SYMBOL4', [], 3),
+    ]
+    builder = BarStoreBuilder(['SYMBOL1', 'SYMBOL2', 'SYMBOL3', 'SYMBOL4'], capacity=2)
+    for symbol, df in zip(['SYMBOL3', 'SYMBOL1', 'SYMBOL2', 'SYMBOL4'], dfs):
+        builder.add(symbol, df)
+        assert len(builder.snapshot().symbols) == len(builder)
+
+    expected = BarStore.from_dataframe(pivot(concat(dfs), index='t', columns='symbol'))
+    bar_store = builder.build()
+    assert bar_store.symbols == expected.symbols
+    assert bar_store.timestamps.tolist() == expected.timestamps.tolist()
+    for field in ('o', 'h', 'l', 'c'):
+        np.testing.assert_array_equal(bar_store.field(field), expected.field(field))
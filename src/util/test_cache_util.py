@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from pandas import DataFrame
+import util.cache_util
+from util.cache_util import CacheIndex, cache_size, file_lock, cache_stats, get_cached_dataframe, get_cached_dict, set_cache_max_bytes
+
+
+@pytest.fixture(autouse=True)
+def cache_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(util.cache_util, 'CACHE_PATH', str(tmp_path))
+    return tmp_path
+
+
+def test_get_cached_dict_stats():
+    assert get_cached_dict('namespace', 'key', lambda: {'a': 1}) == {'a': 1}
+    assert get_cached_dict('namespace', 'key', lambda: {'a': 2}) == {'a': 1}
+    stats = cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+    assert cache_size() == os.path.getsize(util.cache_util.get_file_path('namespace', 'key', 'pickle'))
+
+
+def test_lru_eviction(cache_path):
+    get_cached_dict('namespace', 'key1', lambda: {'a': 'x' * 1000})
+    get_cached_dict('namespace', 'key2', lambda: {'a': 'x' * 1000})
+    # key1 becomes the most recently used entry
+    get_cached_dict('namespace', 'key1', lambda: None)
+    set_cache_max_bytes(2500)
+    get_cached_dict('namespace', 'key3', lambda: {'a': 'x' * 1000})
+
+    assert cache_stats()['evictions'] == 1
+    assert not os.path.exists(util.cache_util.get_file_path('namespace', 'key2', 'pickle'))
+    assert os.path.exists(util.cache_util.get_file_path('namespace', 'key1', 'pickle'))
+    assert cache_size() <= 2500
+
+
+def test_index_rebuilt_from_existing_files(cache_path):
+    get_cached_dict('namespace', 'key', lambda: {'a': 1})
+    size = cache_size()
+    os.remove(os.path.join(str(cache_path), util.cache_util.CACHE_INDEX_FILE))
+    util.cache_util._cache_index = None
+    assert cache_size() == size
+
+
+def write_file(path, name, size):
+    file_path = os.path.join(str(path), name)
+    with open(file_path, 'wb') as f:
+        f.write(b'x' * size)
+    return file_path
+
+
+def test_index_shared_between_processes(cache_path):
+    # Two indexes on the same directory, like two processes
+    first = CacheIndex(str(cache_path))
+    second = CacheIndex(str(cache_path))
+    index_version = first.index_version
+    first.add(write_file(cache_path, 'a', 100))
+    second.add(write_file(cache_path, 'b', 200))
+    # Adding appends to the journal instead of rewriting the index file
+    assert first._version() == index_version
+
+    assert sorted(CacheIndex(str(cache_path)).entries) == ['a', 'b']
+    assert CacheIndex(str(cache_path)).size == 300
+
+    # The budget counts the files added by the other index
+    first.max_bytes = 250
+    first.add(write_file(cache_path, 'c', 100))
+    assert not os.path.exists(os.path.join(str(cache_path), 'a'))
+    assert not os.path.exists(os.path.join(str(cache_path), 'b'))
+    reloaded = CacheIndex(str(cache_path))
+    assert sorted(reloaded.entries) == ['c']
+    assert reloaded.size == 100
+
+
+def test_eviction_skips_entries_in_use(cache_path):
+    cache_index = CacheIndex(str(cache_path), max_bytes=150)
+    in_use = write_file(cache_path, 'a', 100)
+    cache_index.add(in_use)
+    with file_lock(in_use, exclusive=False):
+        cache_index.add(write_file(cache_path, 'b', 100))
+        assert os.path.exists(in_use)
+    assert cache_index.size == 200
+
+    # Evicted once released
+    cache_index.add(write_file(cache_path, 'c', 10))
+    assert not os.path.exists(in_use)
+    assert cache_index.size == 110
+
+
+def test_journal_compacted(cache_path, monkeypatch):
+    monkeypatch.setattr(util.cache_util, 'JOURNAL_COMPACT_EVERY', 3)
+    first = CacheIndex(str(cache_path))
+    second = CacheIndex(str(cache_path))
+    for name in ('a', 'b', 'c', 'd'):
+        first.add(write_file(cache_path, name, 10))
+    assert first.journal_lines == 1
+    second.add(write_file(cache_path, 'e', 10))
+    assert sorted(second.entries) == ['a', 'b', 'c', 'd', 'e']
+    assert second.size == 50
+
+
+def _get_cached_dataframe_in_process(cache_path, value):
+    from pandas import DataFrame
+    util.cache_util.CACHE_PATH = cache_path
+    return get_cached_dataframe('frames', 'key', lambda: DataFrame({'a': [value]}))['a'][0]
+
+
+def test_get_cached_dataframe(cache_path):
+    df = DataFrame({'a': [1, 2]}, index=[10, 20])
+    assert get_cached_dataframe('frames', 'key1', lambda: df).equals(df)
+    assert get_cached_dataframe('frames', 'key1', lambda: None).equals(df)
+    other = get_cached_dataframe('frames', 'key2', lambda: df * 2)
+    assert other['a'].tolist() == [2, 4]
+    assert cache_stats()['hits'] == 1
+
+
+def test_get_cached_dataframe_concurrent_processes(cache_path):
+    # Every process gets the frame written by the first one to take the lock
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        values = list(pool.map(_get_cached_dataframe_in_process, [str(cache_path)] * 8, range(8)))
+    assert len(set(values)) == 1
@@ -0,0 +1,112 @@
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+from pandas import DataFrame, to_datetime
+from pytz import utc
+from benchmark.synthetic import generate_market_data
+from executor.simple_executor import SimpleExecutor
+import util.resample
+from util.bar_store import BarStore
+from util.resample import get_rollup, get_rollup_path, resample_bar_store, resample_bars
+
+
+def get_index(timestamps, rule):
+    # Daily bars are the calendar days of US/Eastern
+    return to_datetime(timestamps, unit='ms', utc=True).tz_convert('US/Eastern' if rule == '1D' else 'UTC')
+
+
+def pandas_resample(bar_store, field, rule, how):
+    df = DataFrame(bar_store.field(field), index=get_index(bar_store.timestamps, rule))
+    resampled = getattr(df.resample(rule), how)()
+    # Buckets without any row are not rolled up
+    return resampled.loc[df.index.floor(rule).unique()].to_numpy()
+
+
+@pytest.mark.parametrize('timeframe,rule', [('5m', '5min'), ('15m', '15min'), ('1h', '1h'), ('1d', '1D')])
+# Blocks of many buckets, of one bucket and of buckets longer than a block
+@pytest.mark.parametrize('resample_rows', [4096, 50, 1])
+def test_resample_bar_store_same_as_pandas(timeframe, rule, resample_rows, monkeypatch):
+    monkeypatch.setattr(util.resample, 'RESAMPLE_ROWS', resample_rows)
+    bar_store = BarStore.from_dataframe(generate_market_data(5, 390 * 3, 'minute', missing=0.3))
+    rollup = resample_bar_store(bar_store, timeframe)
+
+    assert rollup.symbols == bar_store.symbols
+    assert (to_datetime(rollup.timestamps, unit='ms', utc=True) == get_index(bar_store.timestamps, rule).floor(rule).unique()).all()
+    for field, how in (('o', 'first'), ('h', 'max'), ('l', 'min'), ('c', 'last')):
+        np.testing.assert_array_equal(rollup.field(field), pandas_resample(bar_store, field, rule, how))
+
+
+def test_resample_bar_store_to_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(util.resample, 'RESAMPLE_ROWS', 100)
+    BarStore.from_dataframe(generate_market_data(5, 390 * 2, 'minute', missing=0.3)).index_active().save(str(tmp_path / 'bars'))
+    bar_store = BarStore.load(str(tmp_path / 'bars'))
+    expected = resample_bar_store(bar_store, '15m')
+
+    resample_bar_store(bar_store, '15m', path=str(tmp_path / 'rollup'))
+    rollup = BarStore.load(str(tmp_path / 'rollup'))
+    assert rollup.timestamps.tolist() == expected.timestamps.tolist()
+    for field in ('o', 'h', 'l', 'c'):
+        np.testing.assert_array_equal(rollup.field(field), expected.field(field))
+    assert rollup.active_ptr.tolist() == expected.active_ptr.tolist()
+
+
+def test_resample_bars():
+    df = DataFrame({
+        't': [0, 60000, 120000, 300000],
+        'o': [1, 2, 3, 4],
+        'c': [1.5, 2.5, 3.5, 4.5],
+        'h': [2, 3, 4, 5],
+        'l': [0.5, 1.5, 2.5, 3.5],
+        'symbol': 'SYMBOL1',
+    })
+    resampled = resample_bars(df, '5m')
+    assert resampled['t'].tolist() == [0, 300000]
+    assert resampled['o'].tolist() == [1, 4]
+    assert resampled['c'].tolist() == [3.5, 4.5]
+    assert resampled['h'].tolist() == [4, 5]
+    assert resampled['l'].tolist() == [0.5, 3.5]
+    assert resampled['symbol'].tolist() == ['SYMBOL1', 'SYMBOL1']
+
+
+def test_resample_bars_daily_after_hours():
+    # 2019-01-02 15:59 ET, 19:30 ET after hours (00:30 UTC on the 3rd) and
+    # 2019-01-03 09:30 ET, then 2019-07-01 09:30 EDT
+    df = DataFrame({
+        't': [1546462740000, 1546475400000, 1546525800000, 1561987800000],
+        'o': [1, 2, 3, 4],
+        'c': [1.5, 2.5, 3.5, 4.5],
+        'h': [2, 3, 4, 5],
+        'l': [0.5, 1.5, 2.5, 3.5],
+        'symbol': 'SYMBOL1',
+    })
+    resampled = resample_bars(df, '1d')
+    # Buckets start at midnight ET: 05:00 UTC in winter, 04:00 UTC in summer
+    assert resampled['t'].tolist() == [1546405200000, 1546491600000, 1561953600000]
+    assert resampled['o'].tolist() == [1, 3, 4]
+    assert resampled['c'].tolist() == [2.5, 3.5, 4.5]
+
+
+def test_execute_strategy_timeframe(tmp_path):
+    data = generate_market_data(3, 390 * 2, 'minute', missing=0)
+    path = str(tmp_path / 'bars')
+    BarStore.from_dataframe(data).save(path)
+    start = datetime(2019, 1, 1, 14, tzinfo=utc)
+    end = datetime(2019, 1, 2, 20, tzinfo=utc)
+    symbol = data['c'].columns[0]
+
+    def strategy(now, request_new_order, historical_data, current_data, positions, cash):
+        request_new_order(symbol, 1, 'buy', 'market', 'day', None, None, False, 'order')
+
+    executor = SimpleExecutor()
+    executor.set_cash(10000)
+    expected = executor.execute_strategy(strategy, resample_bar_store(BarStore.from_dataframe(data), '1h'), start, end)
+    assert len(expected) == 14
+
+    for source in (data, path):
+        executor = SimpleExecutor()
+        executor.set_cash(10000)
+        assert executor.execute_strategy(strategy, source, start, end, timeframe='1h').equals(expected)
+    # The rollup of the path is cached next to it
+    assert os.path.exists(get_rollup_path(path, '1h'))
+    assert get_rollup(path, '1h').timestamps.tolist() == expected['t'].map(lambda t: int(t.timestamp() * 1000)).tolist()